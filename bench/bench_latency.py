@@ -0,0 +1,251 @@
+"""
+Measures how long the client has to wait for the server for the things it
+does most often, without needing GDB or a program to debug. GDB is played
+by GdbReplay.py from a recorded session.
+
+    python bench/bench_latency.py [--session FILE] [--speed N] [-n N] [--tcp]
+
+Without --session, a made up session which looks like a C++ program being
+stepped through is used. Record a real one with
+
+    python vimfiles/autoload/gdb/GdbServer.py --record FILE
+
+and drive it with GdbClient.py (or gdb.vim) to measure against a real
+program. The default --speed of 0 plays GDB back as fast as possible, so
+what is measured is our own overhead. The client talks to the server over
+a Unix domain socket, or over TCP with --tcp, which is what the ISBUSY
+round trip mostly measures.
+"""
+
+import os
+import sys
+import time
+import select
+import tempfile
+import threading
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                '..', 'vimfiles', 'autoload', 'gdb'))
+
+from GdbServer import GdbServer
+from GdbClient import GdbClient
+from GdbMiParser import parseGdbMi
+from GdbReplay import SessionRecorder
+import GdbReplay
+
+STACK_DEPTH = 20
+BURST_CMD = 'thread apply all bt full'
+BURST_SIZE = 1024*1024
+
+def consoleReply(cmd, body):
+    return [cmd + '\r\n\r\n\x1a\x1apost-prompt\r\n',
+            body,
+            '\r\n\x1a\x1apre-prompt\r\n(gdb) \r\n\x1a\x1aprompt\r\n']
+
+def frameRecord(level):
+    return ('frame={level="%d",addr="0x00000000004005%02x",func="Worker::step%d",'
+            'file="worker.cpp",fullname="/home/user/src/worker.cpp",line="%d"}'
+            % (level, level, level, 100 + level))
+
+def makeSyntheticSession(fileName):
+    """
+    Writes a recording of a session in which the usual commands are run
+    once each.
+    """
+    rec = SessionRecorder(fileName)
+    now = [0.0]
+    def record(stream, data, delay=0.0005):
+        now[0] += delay
+        rec.record(stream, data, now[0])
+
+    record('out', 'GNU gdb (GDB) 8.1\r\nReading symbols from worker...done.\r\n'
+                  '\r\n\x1a\x1apre-prompt\r\n(gdb) \r\n\x1a\x1aprompt\r\n')
+
+    def console(cmd, body, delay=0.0005):
+        record('in', cmd + '\n')
+        for part in consoleReply(cmd, body):
+            record('out', part, delay)
+
+    regs = ['r%-13d0x%-18x%d' % (i, i*4096, i*4096) for i in range(40)]
+    console('info registers', '\r\n'.join(regs) + '\r\n')
+    console('info program', '\tUsing the running image of child process 4242.\r\n'
+                            'Program stopped at 0x4005d0.\r\nIt stopped after being stepped.\r\n')
+
+    # A step takes a while and GDB tells us where we ended up.
+    record('in', 'next\n')
+    record('out', 'next\r\n\r\n\x1a\x1apost-prompt\r\n\r\n\x1a\x1astarting\r\n')
+    record('out', '\r\n\x1a\x1aframes-invalid\r\n\r\n\x1a\x1astopped\r\n'
+                  '\r\n\x1a\x1asource /home/user/src/worker.cpp:101:2874:beg:0x4005d0\r\n', 0.002)
+    record('out', '\r\n\x1a\x1apre-prompt\r\n(gdb) \r\n\x1a\x1aprompt\r\n')
+
+    # What a thread apply all bt full over a lot of threads looks like.
+    line = '#%d  0x00000000004005d0 in Worker::step (this=0x602010, count=42, name=0x400e34 "worker") at worker.cpp:101\r\n'
+    lines = []
+    size = 0
+    n = 0
+    while size < BURST_SIZE:
+        lines.append(line % (n % 64))
+        size += len(lines[-1])
+        n += 1
+    body = ''.join(lines)
+    record('in', BURST_CMD + '\n')
+    record('out', BURST_CMD + '\r\n\r\n\x1a\x1apost-prompt\r\n')
+    for start in range(0, len(body), 4095):
+        record('out', body[start:start+4095], 0.00001)
+    record('out', '\r\n\x1a\x1apre-prompt\r\n(gdb) \r\n\x1a\x1aprompt\r\n')
+
+    frame = '^done,' + frameRecord(0)
+    stack = '^done,stack=[%s]' % ','.join([frameRecord(i) for i in range(STACK_DEPTH)])
+    changes = '^done,changelist=[%s]' % ','.join(
+        ['{name="var%d",value="%d",in_scope="true",type_changed="false",has_more="0"}' % (i, i)
+         for i in range(10)])
+
+    # The MI commands, both over the MI channel and the console.
+    for (cmd, result) in [('-stack-info-frame', frame),
+                          ('-stack-list-frames 0 %d' % STACK_DEPTH, stack),
+                          ('-var-update 1 *', changes)]:
+        record('mi-in', cmd)
+        record('mi-out', result)
+        console('interpreter mi "%s"' % cmd, result + '\r\n(gdb) \r\n')
+
+    record('mi-in', '-interpreter-exec console "info program"')
+    record('mi-out', '~"\\tUsing the running image of child process 4242.\\n"')
+    record('mi-out', '^done')
+
+    rec.close()
+
+class BenchClient(GdbClient):
+    """
+    Does what VimGdbClient does for each of the operations we time, minus
+    the updating of VIM.
+    """
+    def __init__(self, address):
+        GdbClient.__init__(self, address)
+        self.chunks = []
+        self.numResumes = 0
+        self.hasMiChannel = True
+
+    def onNewData(self, data):
+        self.chunks.append(data)
+
+    def onEvent(self, kind, payload):
+        if kind == 'RESUME':
+            self.numResumes += 1
+        else:
+            GdbClient.onEvent(self, kind, payload)
+
+    def runCommand(self, cmd):
+        self.chunks = []
+        self.getReply('SYNC ' + cmd)
+        return ''.join(self.chunks)
+
+    def getParsedGdbMiOutput(self, cmd):
+        out = ''
+        if self.hasMiChannel:
+            self.chunks = []
+            self.getReply('MI ' + cmd)
+            out = ''.join(self.chunks)
+            if self.replyStatus == 'NOMI':
+                self.hasMiChannel = False
+        if not self.hasMiChannel:
+            out = self.runCommand('interpreter mi "%s"' % cmd)
+
+        for line in out.splitlines():
+            if line.startswith('^'):
+                return parseGdbMi(line)
+
+    def waitForResume(self):
+        numResumes = self.numResumes
+        while self.numResumes == numResumes:
+            select.select([self.conn], [], [], 1.0)
+            self.pollEvents()
+
+    def stepAndRefresh(self):
+        """
+        Steps and then does what gdb#gdb#OnResume() does when the program
+        stops: gets the output, the frame, the stack and the changed
+        variables in one round trip and parses them.
+        """
+        self.getReply('ASYNC next')
+        self.waitForResume()
+
+        cmds = ['-stack-info-frame', 'info program',
+                '-stack-list-frames 0 %d' % STACK_DEPTH, '-var-update 1 *']
+        self.chunks = []
+        self.getReplies(['FLUSH', 'SNAPSHOT ' + '\n'.join(cmds)])
+        lines = ''.join(self.chunks).splitlines()[-len(cmds):]
+        for (cmd, line) in zip(cmds, lines):
+            if cmd.startswith('-'):
+                parseGdbMi(line.split('\t', 1)[0])
+
+def percentile(times, p):
+    times = sorted(times)
+    return times[min(len(times) - 1, int(len(times) * p / 100.0))]
+
+def timeIt(func, n):
+    times = []
+    for i in range(n):
+        start = time.time()
+        func()
+        times.append(time.time() - start)
+    return times
+
+def main():
+    from optparse import OptionParser
+
+    parser = OptionParser()
+    parser.add_option('', '--session', dest='session', default='',
+                      help='recorded session to play back (default: a made up one)')
+    parser.add_option('', '--speed', dest='speed', type='float', default=0.0,
+                      help='multiply recorded delays by this')
+    parser.add_option('-n', dest='n', type='int', default=200,
+                      help='number of times to run each operation')
+    parser.add_option('', '--no-mi-channel', dest='useMiChannel',
+                      action='store_false', default=True)
+    parser.add_option('', '--tcp', dest='useTcp', action='store_true', default=False,
+                      help='talk to the server over TCP instead of a Unix domain socket')
+    (opts, args) = parser.parse_args()
+
+    session = opts.session
+    if not session:
+        fd, session = tempfile.mkstemp(suffix='.rec')
+        os.close(fd)
+        makeSyntheticSession(session)
+
+    replay = GdbReplay.__file__.replace('.pyc', '.py')
+    server = GdbServer('%s %s --speed %s %s' % (sys.executable, replay, opts.speed, session),
+                       opts.useMiChannel, useTcp=opts.useTcp)
+    thread = threading.Thread(target=server.run)
+    # Do not hang around if something goes wrong on our side.
+    thread.setDaemon(True)
+    thread.start()
+
+    client = BenchClient(server.getAddress())
+    client.subscribe()
+    client.waitUntilReady()
+
+    n = opts.n
+    numBursts = max(1, n / 20)
+    results = [
+        ('ISBUSY round trip', timeIt(lambda: client.getReply('ISBUSY'), n)),
+        ('runCommand', timeIt(lambda: client.runCommand('info registers'), n)),
+        ('getParsedGdbMiOutput', timeIt(lambda: client.getParsedGdbMiOutput('-stack-info-frame'), n)),
+        ('step + OnResume refresh', timeIt(client.stepAndRefresh, n)),
+        ('1 MB output burst', timeIt(lambda: client.runCommand(BURST_CMD), numBursts)),
+    ]
+
+    client.getReply('DIE')
+    thread.join()
+    if not opts.session:
+        os.remove(session)
+
+    print 'MI channel: %s' % (client.hasMiChannel and 'yes' or 'no')
+    print 'Transport: %s' % (opts.useTcp and 'TCP' or 'Unix domain socket')
+    print '%-26s %6s %10s %10s' % ('operation', 'runs', 'p50 (ms)', 'p99 (ms)')
+    for (name, times) in results:
+        print '%-26s %6d %10.3f %10.3f' % (name, len(times),
+                                          percentile(times, 50)*1000,
+                                          percentile(times, 99)*1000)
+
+if __name__ == "__main__":
+    main()
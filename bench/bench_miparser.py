@@ -0,0 +1,227 @@
+"""
+Measures how fast parseGdbMi is on MI records of the shapes and sizes GDB
+sends us, and fails if it has got slower than it was.
+
+    python bench/bench_miparser.py [--save-baseline] [--tolerance 0.5]
+
+For every record shape we report records/sec, bytes/sec and how much the
+peak memory of the process grows while parsing one record. The time a
+record takes is also divided by the time a fixed piece of pure Python
+takes on the same machine. This relative time is what is stored in the
+baseline file and compared against it, so the baseline does not need to
+be made on the machine it is checked on. Timings on a busy machine are
+noisy, hence the generous default tolerance: it is meant to catch a parser
+which has become a lot slower, not one which lost a few percent.
+"""
+
+import os
+import sys
+import time
+import json
+import gc
+import resource
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                '..', 'vimfiles', 'autoload', 'gdb'))
+
+from GdbMiParser import parseGdbMi, MiLazyList
+
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             'miparser_baseline.json')
+
+def frame(level):
+    return ('frame={level="%d",addr="0x00007ffff7a2d%03x",func="ns::Worker<int>::step",'
+            'args=[{name="this",value="0x602010"},{name="count",value="%d"}],'
+            'file="worker.cpp",fullname="/home/user/src/worker.cpp",line="%d"}'
+            % (level, level % 4096, level, 100 + level % 1000))
+
+def stackRecord(depth):
+    return '^done,stack=[%s]' % ','.join([frame(i) for i in range(depth)])
+
+def childrenRecord(numChildren):
+    children = ['child={name="var1.m_%d",exp="m_%d",numchild="%d",value="{...}",'
+                'type="std::vector<int, std::allocator<int> >",thread-id="1"}'
+                % (i, i, i % 3) for i in range(numChildren)]
+    return '^done,numchild="%d",children=[%s],has_more="0"' % (numChildren, ','.join(children))
+
+def changelistRecord(numChanges):
+    changes = ['{name="var1.m_%d",value="%d",in_scope="true",type_changed="false",has_more="0"}'
+               % (i, i) for i in range(numChanges)]
+    return '^done,changelist=[%s]' % ','.join(changes)
+
+def nestedRecord(depth):
+    # What the value of a deeply nested structure looks like.
+    value = 'value="42"'
+    for i in range(depth):
+        if i % 2:
+            value = 'level%d={name="l%d",%s}' % (i, i, value)
+        else:
+            value = 'level%d=[{%s},{kind="leaf"}]' % (i, value)
+    return '^done,' + value
+
+def escapedStringRecord(length):
+    piece = 'line \\"%d\\"\\twith\\\\escapes\\n'
+    parts = []
+    size = 0
+    i = 0
+    while size < length:
+        parts.append(piece % i)
+        size += len(parts[-1])
+        i += 1
+    return '^done,name="var1",value="%s",type="const char *"' % ''.join(parts)
+
+def getCorpus():
+    """
+    Returns a list of (shape name, record) pairs.
+    """
+    corpus = []
+    for depth in (10, 100, 1000, 10000, 100000):
+        corpus.append(('stack-%d' % depth, stackRecord(depth)))
+    for numChildren in (10, 1000):
+        corpus.append(('children-%d' % numChildren, childrenRecord(numChildren)))
+    for numChanges in (10, 1000):
+        corpus.append(('changelist-%d' % numChanges, changelistRecord(numChanges)))
+    for depth in (10, 100):
+        corpus.append(('nested-%d' % depth, nestedRecord(depth)))
+    for length in (1000, 100000):
+        corpus.append(('escaped-%d' % length, escapedStringRecord(length)))
+    return corpus
+
+def calibrate():
+    """
+    Returns how long a fixed piece of pure Python takes on this machine.
+    """
+    def work():
+        d = {}
+        for i in xrange(200000):
+            s = 'x%d' % i
+            d[s] = s[1:]
+        return d
+
+    return min([timeOnce(work) for i in range(5)])
+
+def timeOnce(func):
+    start = time.time()
+    func()
+    return time.time() - start
+
+# How many elements of each list a caller looks at in the lazy runs, about
+# what fits in the stack window.
+NUM_SHOWN = 50
+
+def parse(record, mode):
+    """
+    Parses the record the way mode says. In the lazy mode, the first
+    NUM_SHOWN elements of every list are looked at as well.
+    """
+    if mode == 'plain':
+        return parseGdbMi(record)
+    if mode == 'typed':
+        return parseGdbMi(record, typed=True)
+
+    obj = parseGdbMi(record, typed=True, lazy=True)
+    for val in obj.__dict__.values():
+        if isinstance(val, MiLazyList):
+            val[:NUM_SHOWN]
+    return obj
+
+def timeParse(record, mode, minTime=0.5):
+    """
+    Returns the best time per record over enough parses to take at least
+    minTime seconds. Like timeit, we keep the garbage collector out of it.
+    """
+    numRuns = 0
+    best = None
+    gc.collect()
+    gc.disable()
+    try:
+        start = time.time()
+        while numRuns < 1 or time.time() - start < minTime:
+            t = timeOnce(lambda: parse(record, mode))
+            if best is None or t < best:
+                best = t
+            numRuns += 1
+    finally:
+        gc.enable()
+    return best
+
+def peakMemory(record, mode):
+    """
+    Returns by how many KB parsing the record grows the peak memory of a
+    process which has the record already in memory. The parse happens in a
+    child process so that every shape starts afresh.
+    """
+    r, w = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(r)
+        before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        parse(record, mode)
+        after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        os.write(w, str(after - before))
+        os._exit(0)
+
+    os.close(w)
+    out = os.read(r, 100)
+    os.close(r)
+    os.waitpid(pid, 0)
+    return int(out)
+
+def main():
+    from optparse import OptionParser
+
+    parser = OptionParser()
+    parser.add_option('', '--baseline', dest='baseline', default=BASELINE_FILE)
+    parser.add_option('', '--save-baseline', dest='save', action='store_true', default=False,
+                      help='store the numbers of this run as the baseline')
+    parser.add_option('', '--tolerance', dest='tolerance', type='float', default=0.5,
+                      help='how much slower than the baseline a shape may get')
+    (opts, args) = parser.parse_args()
+
+    calibration = calibrate()
+    baseline = {}
+    if not opts.save and os.path.exists(opts.baseline):
+        baseline = json.load(open(opts.baseline))
+
+    print '%-22s %10s %12s %12s %10s %10s %s' % (
+        'shape', 'bytes', 'records/s', 'MB/s', 'peak KB', 'relative', 'baseline')
+
+    results = {}
+    failures = []
+    # Every shape is parsed into plain GdbMiResult objects, into typed
+    # objects and lazily the way VimGdbClient does it.
+    runs = []
+    for (shape, record) in getCorpus():
+        runs.append((shape, record, 'plain'))
+        runs.append((shape + '/typed', record, 'typed'))
+        runs.append((shape + '/lazy', record, 'lazy'))
+
+    for (shape, record, mode) in runs:
+        t = timeParse(record, mode)
+        relative = t / calibration
+        results[shape] = relative
+
+        status = ''
+        if shape in baseline:
+            limit = baseline[shape] * (1 + opts.tolerance)
+            status = '%.4f' % baseline[shape]
+            if relative > limit:
+                status += ' SLOWER'
+                failures.append(shape)
+
+        print '%-22s %10d %12.1f %12.2f %10d %10.4f %s' % (
+            shape, len(record), 1/t, len(record)/t/1e6, peakMemory(record, mode),
+            relative, status)
+
+    if opts.save:
+        f = open(opts.baseline, 'w')
+        json.dump(results, f, indent=1, sort_keys=True)
+        f.close()
+        print 'Saved baseline to %s' % opts.baseline
+
+    if failures:
+        print 'Slower than the baseline: %s' % ', '.join(failures)
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+Measures what :GDB spends before it is ready: importing our modules and
+starting the server. Every import is timed in a fresh interpreter, since a
+module is only ever imported once in VIM. For the server, we time how long
+creating it takes, which is what VIM waits for, and how long it takes
+till it says that GDB is ready, which happens in the background.
+
+    python bench/bench_startup.py [-n N]
+
+GDB itself is played by GdbReplay.py, so the server startup time is our
+own overhead plus the time to start a Python process in place of GDB.
+VimGdbClient can only be imported inside VIM and is left out.
+"""
+
+import os
+import sys
+import time
+import tempfile
+import subprocess
+import threading
+
+GDB_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                       '..', 'vimfiles', 'autoload', 'gdb')
+sys.path.insert(0, GDB_DIR)
+
+# In the order in which s:GdbInitWork() ends up importing them.
+MODULES = ['GdbMiParser', 'GdbClient', 'GdbServer', 'VimGdbServer']
+
+IMPORT_SCRIPT = '''
+import sys, time
+sys.path.insert(0, %r)
+start = time.time()
+import %s
+sys.stdout.write('%%f %%d' %% (time.time() - start, 'pyparsing' in sys.modules))
+'''
+
+def timeImport(module):
+    """
+    Returns how long importing the module takes in a fresh interpreter and
+    whether pyparsing got imported along with it.
+    """
+    out = subprocess.Popen([sys.executable, '-c', IMPORT_SCRIPT % (GDB_DIR, module)],
+                           stdout=subprocess.PIPE).communicate()[0]
+    t, loadsPyparsing = out.split()
+    return float(t), loadsPyparsing == '1'
+
+def timeServerStartup(session):
+    """
+    Returns how long creating the server takes and how long it takes till
+    the server says that GDB is ready.
+    """
+    from GdbServer import GdbServer
+    from GdbClient import GdbClient
+    import GdbReplay
+
+    replay = GdbReplay.__file__.replace('.pyc', '.py')
+    start = time.time()
+    server = GdbServer('%s %s --speed 0 %s' % (sys.executable, replay, session))
+    created = time.time() - start
+
+    thread = threading.Thread(target=server.run)
+    thread.setDaemon(True)
+    thread.start()
+    client = GdbClient(server.getAddress())
+    client.onNewData = lambda data: None
+    client.subscribe()
+    client.waitUntilReady()
+    ready = time.time() - start
+
+    client.getReply('DIE')
+    thread.join()
+    return created, ready
+
+def median(times):
+    return sorted(times)[len(times)/2]
+
+def main():
+    from optparse import OptionParser
+
+    parser = OptionParser()
+    parser.add_option('-n', dest='n', type='int', default=10,
+                      help='number of times to measure everything')
+    (opts, args) = parser.parse_args()
+
+    print '%-24s %10s %10s %s' % ('', 'median ms', 'max ms', 'pyparsing')
+    for module in MODULES:
+        results = [timeImport(module) for i in range(opts.n)]
+        times = [t for (t, loadsPyparsing) in results]
+        print '%-24s %10.2f %10.2f %s' % ('import ' + module, median(times)*1000,
+                                          max(times)*1000,
+                                          results[0][1] and 'yes' or 'no')
+
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    from bench_latency import makeSyntheticSession
+    fd, session = tempfile.mkstemp(suffix='.rec')
+    os.close(fd)
+    makeSyntheticSession(session)
+    try:
+        results = [timeServerStartup(session) for i in range(opts.n)]
+    finally:
+        os.remove(session)
+    for (i, name) in [(0, 'GdbServer()'), (1, 'GDB ready')]:
+        times = [r[i] for r in results]
+        print '%-24s %10.2f %10.2f' % (name, median(times)*1000, max(times)*1000)
+
+if __name__ == "__main__":
+    main()
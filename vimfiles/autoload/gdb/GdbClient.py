@@ -1,27 +1,251 @@
-# Echo client program
 import socket
+import select
 import sys
+import time
 from sockutils import *
 
-def get_reply(input):
-    HOST = '127.0.0.1'                 # The remote host
-    PORT = 50007              # The same port as used by the server
-    s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-    s.connect((HOST, PORT))
+import logging
 
-    
-    sendData(s, input)
-    while 1:
-        data = s.recv(1024)
-        if not data:
-            break
+class GdbClient:
+    """
+    Talks to a TerminalServer over a single long lived connection. Every
+    request is tagged with a number and the server tags its reply with the
+    same number, so several requests can be in flight on the connection at
+    the same time.
+    """
+    def __init__(self, address):
+        # A port number or the path of a Unix domain socket. See
+        # sockutils.py
+        self.address = address
+        self.conn = None
+        self.nextTag = 1
+        self.pendingMsgs = {}
+        self.replyStatus = ''
+        self.inConversation = False
+        # Set when the server tells us that GDB has started up.
+        self.ready = False
 
-        sys.stdout.write(data)
+        self.logger = logging.getLogger(self.getLoggerName())
+
+    def getLoggerName(self):
+        return 'VimGdb.client'
+
+    def debug(self, msg):
+        if self.logger:
+            self.logger.debug(msg)
+
+    def exception(self, msg):
+        if self.logger:
+            self.logger.exception(msg)
+
+    def connect(self):
+        if self.conn:
+            return
+
+        numAttempts = 0
+        while numAttempts < 3:
+            try:
+                self.conn = MsgConnection(connectTo(self.address))
+                return
+            except socket.error, (en, msg):
+                self.debug('Getting connection error %s (%s)' % (en, msg))
+
+            time.sleep(0.1)
+            numAttempts += 1
+
+        raise RuntimeError, "Could not connect to the server at %s" % self.address
+
+    def disconnect(self):
+        if self.conn:
+            self.conn.close()
+            self.conn = None
+        self.pendingMsgs = {}
+
+    def sendRequest(self, input):
+        """
+        Sends a request of the form "MODE command" to the server without
+        waiting for the reply. Returns the tag to pass to readReply().
+        """
+        self.connect()
+
+        tag = self.nextTag
+        self.nextTag += 1
+
+        tokens = input.split(' ', 1)
+        mode = tokens[0]
+        command = ''.join(tokens[1:])
+
+        self.debug('Sending message %d [%s]' % (tag, input))
+        self.conn.sendMsg(tag, mode, command)
+        return tag
+
+    def withPriority(self, input, priority, generation=None):
+        """
+        Returns the request with the given priority, one of 'interactive',
+        'normal' or 'refresh', attached to its mode. A request given the
+        stop generation it is about is dropped by the server with a STALE
+        status once the program has been resumed since. The priority only
+        matters while other requests are waiting, see TerminalServer.
+        """
+        tokens = input.split(' ', 1)
+        tokens[0] += ':%s' % priority
+        if generation is not None:
+            tokens[0] += ':%d' % generation
+        return ' '.join(tokens)
+
+    def readMsgFor(self, tag):
+        msgs = self.pendingMsgs.get(tag)
+        if msgs:
+            return msgs.pop(0)
 
-    print 'shutting down/closing socket...'
-    s.shutdown(2)
-    s.close()
-    del s
+        while 1:
+            msg = self.conn.readMsg()
+            if msg is None:
+                raise RuntimeError, "Server closed the connection"
+            if msg[0] == tag:
+                return msg
+            # A reply to some other request which is still in flight.
+            self.pendingMsgs.setdefault(msg[0], []).append(msg)
+
+    def readReply(self, tag):
+        """
+        Feeds all the output the server sends for the given request to
+        onNewData() and returns the status the server ended it with.
+        """
+        intTags = []
+        while 1:
+            try:
+                (tag, kind, payload) = self.readMsgFor(tag)
+            except KeyboardInterrupt:
+                # The server reads our requests while GDB runs a command,
+                # so we can interrupt a command which takes too long.
+                intTags.append(self.sendRequest('INT'))
+                continue
+            if kind == 'END':
+                break
+            self.onNewData(payload)
+
+        self.pendingMsgs.pop(tag, None)
+        for intTag in intTags:
+            self.readMsgFor(intTag)
+            self.pendingMsgs.pop(intTag, None)
+        self.replyStatus = payload
+        if payload.startswith('ERROR'):
+            self.onRequestError(payload)
+        elif payload:
+            self.onNewData(payload + '\n')
+        return payload
+
+    def onRequestError(self, status):
+        """
+        Called when the server could not run a request.
+        """
+        sys.stderr.write('%s\n' % status)
+
+    def sendAnswer(self, tag, answer):
+        self.conn.sendMsg(tag, 'ANS', answer)
+
+    def getReply(self, input):
+        try:
+            return self.getReply_try(input)
+        except:
+            self.exception('Exception in getting reply!')
+            # Start afresh with a new connection next time.
+            self.disconnect()
+
+    def getReply_try(self, input):
+        self.inConversation = True
+        try:
+            self.currentTag = self.sendRequest(input)
+            return self.readReply(self.currentTag)
+        finally:
+            self.inConversation = False
+
+    def getReplies(self, inputs):
+        """
+        Pipelines several requests over the connection and then reads all
+        the replies in order. Returns the list of reply statuses.
+        """
+        try:
+            self.inConversation = True
+            tags = [self.sendRequest(input) for input in inputs]
+            statuses = []
+            for tag in tags:
+                self.currentTag = tag
+                statuses.append(self.readReply(tag))
+            return statuses
+        except:
+            self.exception('Exception in getting replies!')
+            self.disconnect()
+        finally:
+            self.inConversation = False
+
+    def subscribe(self):
+        """
+        Asks the server to push events such as the inferior stopping over
+        this connection. They are handled by pollEvents().
+        """
+        self.getReply('SUBSCRIBE')
+
+    def unsubscribe(self):
+        """
+        Stops the server from pushing events to us. It then has to find
+        some other way to tell us about them.
+        """
+        self.getReply('UNSUBSCRIBE')
+
+    def pollEvents(self):
+        """
+        Handles all the events the server has pushed to us so far without
+        waiting for more.
+        """
+        if self.inConversation:
+            return
+
+        try:
+            events = self.pendingMsgs.pop(0, [])
+            while self.conn and self.conn.hasPendingData():
+                msg = self.conn.readMsg()
+                if msg is None:
+                    self.disconnect()
+                    break
+                if msg[0] == 0:
+                    events.append(msg)
+                else:
+                    self.pendingMsgs.setdefault(msg[0], []).append(msg)
+        except:
+            self.exception('Exception while polling for events!')
+            self.disconnect()
+            return
+
+        for (tag, kind, payload) in events:
+            self.debug('Got event %s [%s]' % (kind, payload))
+            self.onEvent(kind, payload)
+
+    def flush(self):
+        """
+        Gets the output the server has kept for us since the last flush.
+        """
+        self.getReply('FLUSH')
+
+    def waitUntilReady(self):
+        """
+        Blocks till GDB has started up, passing on what it says meanwhile
+        to onNewData(). Needs a subscribed connection.
+        """
+        while not self.ready:
+            select.select([self.conn], [], [], 0.1)
+            self.pollEvents()
+            self.flush()
+
+    def onEvent(self, kind, payload):
+        if kind == 'READY':
+            self.ready = True
+        elif kind == 'QUERY':
+            self.sendAnswer(0, 'y')
+
+    def onNewData(self, data):
+        sys.stdout.write(data)
 
 def get_raw_non_trivial_input():
     q = ''
@@ -31,9 +255,12 @@ def get_raw_non_trivial_input():
     return q
 
 if __name__ == "__main__":
+    client = GdbClient(parseAddress(sys.argv[1]))
+    client.subscribe()
+    client.waitUntilReady()
     while 1:
         q = get_raw_non_trivial_input()
         if q == 'quit':
             break
 
-        get_reply(q)
+        client.getReply(q)
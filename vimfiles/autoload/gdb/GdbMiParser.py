@@ -1,10 +1,13 @@
-from pyparsing import Literal, Word, Group, alphanums, delimitedList, \
-        Forward, dblQuotedString, Regex
-
 import types
 import re
+import sys
 
 def getGdbMiParser():
+    # pyparsing takes longer to import than everything else we load when
+    # VIM starts up, so it is only imported when the grammar is needed.
+    from pyparsing import Literal, Group, delimitedList, Forward, \
+            dblQuotedString, Regex
+
     equals   = Literal('=').suppress()
     lcbrack  = Literal('{')
     rcbrack  = Literal('}').suppress()
@@ -83,53 +86,474 @@ def convertTopListToObj(list):
 
     return obj
 
-parser = getGdbMiParser()
-def parseGdbMi(input):
+# Built by the first call to parseGdbMiPyparsing().
+parser = None
+def parseGdbMiPyparsing(input):
+    """
+    Reference implementation of parseGdbMi() built on the pyparsing
+    grammar. It is a lot slower than the hand written scanner below and is
+    only kept around to cross-check it.
+    """
     global parser
+    if parser is None:
+        parser = getGdbMiParser()
 
     bnf_out = parser.parseString(input)
     return convertTopListToObj(parseTreeToObj(bnf_out.asList()))
 
+# ======================================================
+# Hand written scanner
+# ======================================================
+# The functions below walk the MI record exactly once from left to right.
+# Each of them takes the input string and the position to start parsing
+# from and returns the parsed object along with the position just past it.
+# The objects returned are identical to what parseTreeToObj() creates from
+# the pyparsing output.
+
+class GdbMiParseError(Exception):
+    pass
+
+_recordPat = re.compile(r'\s*\^(done|running|error|exit),')
+_varPat = re.compile(r'[a-zA-Z0-9_-]+=')
+
+def _parseError(input, pos, expected):
+    return GdbMiParseError('Expected %s at position %d: [%s]' % (expected, pos, input[pos:pos+40]))
+
+def _scanString(input, pos):
+    # pos is at the opening quote. Look for the first quote which is not
+    # escaped by an odd number of backslashes. Returns the text between the
+    # quotes as is.
+    end = input.find('"', pos + 1)
+    while end != -1 and input[end - 1] == '\\':
+        numSlashes = 1
+        while input[end - 1 - numSlashes] == '\\':
+            numSlashes += 1
+        if numSlashes % 2 == 0:
+            break
+        end = input.find('"', end + 1)
+
+    if end == -1:
+        raise _parseError(input, pos, 'closing quote')
+
+    return input[pos+1:end], end + 1
+
+def _parseString(input, pos):
+    val, pos = _scanString(input, pos)
+    if val.isdigit():
+        return int(val), pos
+    return val, pos
+
+def _parseResult(input, pos, typed=False):
+    m = _varPat.match(input, pos)
+    if not m:
+        raise _parseError(input, pos, 'variable')
+    end = m.end()
+    key = input[m.start():end-1]
+    if typed:
+        ch = input[end:end+1]
+        if ch == '{' and key in _tupleTypes:
+            val, pos = _parseTypedTuple(input, end, _tupleTypes[key])
+            return key, val, pos
+        if ch == '[':
+            val, pos = _parseList(input, end, True, _listElementTypes.get(key))
+            return key, val, pos
+    val, pos = _parseValue(input, end, typed)
+    return key, val, pos
+
+def _parseTuple(input, pos, typed=False):
+    # pos is at the opening brace.
+    pos += 1
+    if input.startswith('}', pos):
+        return {}, pos + 1
+
+    obj = GdbMiResult()
+    while True:
+        key, val, pos = _parseResult(input, pos, typed)
+        setattr(obj, key, val)
+
+        ch = input[pos:pos+1]
+        if ch == ',':
+            pos += 1
+        elif ch == '}':
+            return obj, pos + 1
+        else:
+            raise _parseError(input, pos, '"," or "}"')
+
+def _parseList(input, pos, typed=False, elementType=None):
+    # pos is at the opening square bracket.
+    pos += 1
+    ch = input[pos:pos+1]
+    if ch == ']':
+        return [], pos + 1
+
+    # A list either contains only values or only results.
+    isValueList = ch in ('"', '{', '[')
+
+    ret = []
+    while True:
+        val, pos = _parseListElement(input, pos, isValueList, typed, elementType)
+        ret.append(val)
+
+        ch = input[pos:pos+1]
+        if ch == ',':
+            pos += 1
+        elif ch == ']':
+            return ret, pos + 1
+        else:
+            raise _parseError(input, pos, '"," or "]"')
+
+def _parseListElement(input, pos, isValueList, typed, elementType):
+    if isValueList:
+        if elementType and input.startswith('{', pos):
+            return _parseTypedTuple(input, pos, elementType)
+        return _parseValue(input, pos, typed)
+
+    key, val, pos = _parseResult(input, pos, typed)
+    if typed:
+        return MiListItem((key, val)), pos
+    obj = GdbMiResult()
+    setattr(obj, key, val)
+    return obj, pos
+
+def _parseValue(input, pos, typed=False):
+    ch = input[pos:pos+1]
+    if ch == '"':
+        return _parseString(input, pos)
+    if ch == '{':
+        return _parseTuple(input, pos, typed)
+    if ch == '[':
+        return _parseList(input, pos, typed)
+    raise _parseError(input, pos, 'value')
+
+def cUnescape(quoted):
+    """
+    Turns a C string constant as GDB/MI prints it (including the quotes)
+    into the string it stands for.
+    """
+    return quoted[1:-1].decode('string_escape')
+
+def cEscape(text):
+    """
+    The opposite of cUnescape(), without the quotes. A value with a
+    newline in it has to be escaped before it goes on a line of a VIM
+    buffer.
+    """
+    return text.encode('string_escape').replace("\\'", "'").replace('"', '\\"')
+
+# ======================================================
+# Typed records
+# ======================================================
+# The records we look at all the time are decoded into the classes below
+# instead of GdbMiResult when parseGdbMi() is asked for typed=True. They
+# have no __dict__, the fields which are numbers are converted to ints
+# and all the other strings are unescaped. See cEscape() for showing
+# them. Fields which GDB sends but we did not expect are still available
+# as attributes, as GdbMiResult would have them. A field GDB did not send
+# raises AttributeError, just as with GdbMiResult.
+
+class MiRecord(object):
+    __slots__ = ('_extra',)
+
+    # The fields which hold numbers. The ones holding addresses are in
+    # hex.
+    intFields = ()
+    hexFields = ()
+    # The fields whose MI names are not valid attribute names.
+    miNames = {'from_': 'from', 'thread_id': 'thread-id'}
+
+    def __getattr__(self, name):
+        # Only called when a field was not set.
+        try:
+            extra = object.__getattribute__(self, '_extra')
+        except AttributeError:
+            extra = None
+        if extra and name in extra:
+            return extra[name]
+        raise AttributeError(name)
+
+    def setExtra(self, key, val):
+        try:
+            self._extra[key] = val
+        except AttributeError:
+            self._extra = {key: val}
+
+class MiFrame(MiRecord):
+    # "from" is a keyword, so the library a frame is in lives in from_.
+    __slots__ = ('level', 'addr', 'func', 'file', 'fullname', 'line', 'from_', 'arch', 'args')
+    intFields = ('level', 'line')
+    hexFields = ('addr',)
+
+class MiChild(MiRecord):
+    __slots__ = ('name', 'exp', 'numchild', 'value', 'type', 'thread_id', 'has_more')
+    intFields = ('numchild', 'thread_id', 'has_more')
+
+class MiVarChange(MiRecord):
+    __slots__ = ('name', 'value', 'in_scope', 'type_changed', 'new_type',
+                 'new_num_children', 'has_more', 'dynamic', 'displayhint')
+    intFields = ('new_num_children', 'has_more')
+
+class MiVarObj(MiRecord):
+    """
+    What -var-create says about the variable object it created. This is
+    the whole record, so it has to be asked for with recordType.
+    """
+    __slots__ = ('name', 'numchild', 'value', 'type', 'thread_id', 'has_more',
+                 'dynamic', 'displayhint')
+    intFields = ('numchild', 'thread_id', 'has_more')
+
+class MiArg(MiRecord):
+    __slots__ = ('name', 'value', 'type')
+
+class MiListItem(tuple):
+    """
+    An element of a list of results, such as frame={...} in the reply to
+    -stack-list-frames. It is a (name, value) pair and item.frame gives the
+    value.
+    """
+    __slots__ = ()
+
+    def __getattr__(self, name):
+        if name == self[0]:
+            return self[1]
+        raise AttributeError(name)
+
+# Which class to decode a tuple into, by the name it is given.
+_tupleTypes = {'frame': MiFrame, 'child': MiChild}
+# Which class to decode the tuples in a list into, by the name of the list.
+_listElementTypes = {'changelist': MiVarChange, 'args': MiArg}
+
+def _fieldInfo(cls):
+    """
+    Returns a map from MI field name to (slot name, kind) for the typed
+    class, where kind is 'int', 'hex' or 'str'.
+    """
+    info = cls.__dict__.get('_fieldInfo')
+    if info is None:
+        info = {}
+        for slot in cls.__slots__:
+            key = cls.miNames.get(slot, slot)
+            if slot in cls.intFields:
+                info[key] = (slot, 'int')
+            elif slot in cls.hexFields:
+                info[key] = (slot, 'hex')
+            else:
+                info[key] = (slot, 'str')
+        cls._fieldInfo = info
+    return info
+
+# Matches a field name along with its value if the value is a string
+# without any escapes in it, which most are.
+_simpleFieldPat = re.compile(r'([a-zA-Z0-9_-]+)=(?:"([^"\\]*)")?')
+
+def _parseTypedFields(input, pos, obj, endChar):
+    info = _fieldInfo(type(obj))
+    match = _simpleFieldPat.match
+    while True:
+        m = match(input, pos)
+        if not m:
+            raise _parseError(input, pos, 'variable')
+        key = m.group(1)
+        field = info.get(key)
+        raw = m.group(2)
+        if raw is None and field and input.startswith('"', m.end()):
+            raw, end = _scanString(input, m.end())
+            raw = raw.decode('string_escape')
+        else:
+            end = m.end()
+
+        if raw is not None and field:
+            slot, kind = field
+            if kind == 'str':
+                val = raw
+            else:
+                try:
+                    val = int(raw, kind == 'hex' and 16 or 10)
+                except ValueError:
+                    val = raw
+            setattr(obj, slot, val)
+            pos = end
+        else:
+            key, val, pos = _parseResult(input, pos, True)
+            if field:
+                setattr(obj, field[0], val)
+            else:
+                obj.setExtra(key, val)
+
+        ch = input[pos:pos+1]
+        if ch == ',':
+            pos += 1
+        elif ch == endChar or (endChar is None and ch == ''):
+            return pos
+        else:
+            raise _parseError(input, pos, '"," or "%s"' % endChar)
+
+def _parseTypedTuple(input, pos, cls):
+    # pos is at the opening brace.
+    obj = cls()
+    if input.startswith('}', pos + 1):
+        return obj, pos + 2
+    pos = _parseTypedFields(input, pos + 1, obj, '}')
+    return obj, pos + 1
+
+# ======================================================
+# Lazy lists
+# ======================================================
+# GDB can send us a list of thousands of frames or variables of which we
+# only ever look at a few. A lazy list finds out where each element starts
+# with one quick scan and only decodes an element when it is asked for.
+
+# The tokens which matter when looking for the end of a list element:
+# whole tuples with nothing nested in them (most are like that), whole
+# strings (which might contain anything), brackets and commas.
+_string = r'"[^"\\]*(?:\\.[^"\\]*)*"'
+_listTokenPat = re.compile(r'\{[^][{}"]*(?:%s[^][{}"]*)*\}|%s|[][{},]' % (_string, _string))
+
+def _scanListElements(input, pos):
+    """
+    pos is at the opening square bracket of a list. Returns the positions
+    at which its elements start and the position just past the list.
+    """
+    if input.startswith(']', pos + 1):
+        return [], pos + 2
+
+    starts = [pos + 1]
+    depth = 0
+    for m in _listTokenPat.finditer(input, pos + 1):
+        ch = input[m.start()]
+        if ch == '"' or m.end() - m.start() > 1:
+            continue
+        if ch == '[' or ch == '{':
+            depth += 1
+        elif ch == ']' or ch == '}':
+            if depth == 0:
+                return starts, m.end()
+            depth -= 1
+        elif depth == 0:
+            starts.append(m.end())
+
+    raise _parseError(input, pos, '"]"')
+
+class MiLazyList(object):
+    """
+    Behaves like the list _parseList() would have returned, but decodes
+    an element the first time it is asked for.
+    """
+    __slots__ = ('input', 'starts', 'items', 'isValueList', 'typed', 'elementType')
+
+    def __init__(self, input, starts, typed, elementType):
+        self.input = input
+        self.starts = starts
+        self.items = [None] * len(starts)
+        self.isValueList = bool(starts) and input[starts[0]] in '"{['
+        self.typed = typed
+        self.elementType = elementType
+
+    def __len__(self):
+        return len(self.starts)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self.starts)))]
+
+        item = self.items[index]
+        if item is None:
+            item, pos = _parseListElement(self.input, self.starts[index],
+                                          self.isValueList, self.typed,
+                                          self.elementType)
+            self.items[index] = item
+        return item
+
+    def __iter__(self):
+        for i in xrange(len(self.starts)):
+            yield self[i]
+
+def parseGdbMi(input, typed=False, recordType=None, lazy=False):
+    """
+    Parses a GDB/MI result record into an object with an attribute for
+    every result. With typed=True, the tuples and lists we know about are
+    decoded into the compact classes above. recordType is the typed class
+    to decode the record itself into, if any. With lazy=True, the lists
+    in the record are MiLazyLists.
+    """
+    m = _recordPat.match(input)
+    if not m:
+        raise _parseError(input, 0, 'result record')
+
+    if recordType:
+        obj = recordType()
+        _parseTypedFields(input.rstrip(), m.end(), obj, None)
+        return obj
+
+    obj = GdbMiResult()
+    pos = m.end()
+    while True:
+        if lazy:
+            v = _varPat.match(input, pos)
+            if v and input.startswith('[', v.end()):
+                key = input[pos:v.end()-1]
+                starts, pos = _scanListElements(input, v.end())
+                elementType = typed and _listElementTypes.get(key) or None
+                setattr(obj, key, MiLazyList(input, starts, typed, elementType))
+                if not input.startswith(',', pos):
+                    break
+                pos += 1
+                continue
+
+        key, val, pos = _parseResult(input, pos, typed)
+        setattr(obj, key, val)
+        if not input.startswith(',', pos):
+            break
+        pos += 1
+
+    return obj
+
 if __name__ == '__main__':
+    # Every record parsed below is remembered so that we can cross-check
+    # the scanner against the pyparsing grammar at the very end.
+    samples = []
+    def parseAndRecord(input):
+        samples.append(input)
+        return parseGdbMi(input)
+
     input = '''^done,children=[child={name="var1",numchild="3"}]'''
-    obj = parseGdbMi(input)
+    obj = parseAndRecord(input)
     print obj.children[0].child.name
 
     input = '''^done,children=[{name="var1",numchild="3"}]'''
-    obj = parseGdbMi(input)
+    obj = parseAndRecord(input)
     print obj.children[0].name
 
     input = '^done,name="var1",numchild="1",type="class CG::Scope *"'
-    obj = parseGdbMi(input)
+    obj = parseAndRecord(input)
     print obj.type
 
     input = '^done,numchild="1",children=[child={name="var1.CG_Scope",exp="CG_Scope",numchild="2",type="CG_Scope"}]'
-    obj = parseGdbMi(input)
+    obj = parseAndRecord(input)
     children = obj.children
     for ch in children:
         print ch.child.name, ch.child.numchild
 
     input = '^done,numchild="1",children=[child={name="var1.CG_Scope",exp="CG_Scope",numchild="2",value="{...}",type="CG_Scope",thread-id="5"}]'
-    obj = parseGdbMi(input)
+    obj = parseAndRecord(input)
     children = obj.children
     for ch in children:
         print ch.child.name, ch.child.numchild
 
     input = r'^done,changelist=[{name="var1.public.foo1",value="0x401018 \"hello world\"",in_scope="true",type_changed="false"},{name="var1.public.foo4",value="8",in_scope="true",type_changed="false"}]'
-    obj = parseGdbMi(input)
+    obj = parseAndRecord(input)
     changelist = obj.changelist
     for change in changelist:
         print change.name, 'changed to', change.value
 
     input = r'^done,changelist=[]'
-    obj = parseGdbMi(input)
+    obj = parseAndRecord(input)
     changelist = obj.changelist
     for change in changelist:
         print change.name, 'changed to', change.value
 
     print '========================='
     input = r"""^done,changelist=[{name="var1",value="0x8ef6148",in_scope="true",type_changed="false"},{name="var1.name",value="0x8ef6168",in_scope="true",type_changed="false"},{name="var1.name.length",value="1",in_scope="true",type_changed="false"},{name="var1.name.buffer",value="0x8ef6178 \"f\"",in_scope="true",type_changed="false"},{name="var1.lineNumber",value="2",in_scope="true",type_changed="false"}]"""
-    output = parseGdbMi(input)
+    output = parseAndRecord(input)
     changelist = output.changelist
     for change in changelist:
         varname = change.name
@@ -147,7 +571,7 @@ if __name__ == '__main__':
 
     print '========================='
     input = r'^done,stack=[frame={level="190",addr="0x00002b8254e1dd17",func="??",from="/mathworks/devel/sandbox/savadhan/Acgirb/matlab/bin/glnxa64/../../bin/glnxa64/libmwmcr.so"},frame={level="191",addr="0x00002b8254e1e0d4",func="??",from="/mathworks/devel/sandbox/savadhan/Acgirb/matlab/bin/glnxa64/../../bin/glnxa64/libmwmcr.so"},frame={level="192",addr="0x0000000000402958",func="boost::function0<void, std::allocator<boost::function_base> >::(function0)",file="//mathworks/hub/3rdparty/R2009a/77023/glnxa64/boost/include/boost-1_35/boost/function/function_template.hpp",fullname="/mathworks/hub/3rdparty/R2009a/77023/glnxa64/boost/include/boost-1_35/boost/function/function_template.hpp",line="825"},frame={level="193",addr="0x00000000004024cc",func="mcrMain",file="matlab.cpp",fullname="/mathworks/BLR/devel/bat/Aslrtw/build/matlab/src/main/matlab.cpp",line="141"},frame={level="194",addr="0x00002b8254e4131c",func="??",from="/mathworks/devel/sandbox/savadhan/Acgirb/matlab/bin/glnxa64/../../bin/glnxa64/libmwmcr.so"},frame={level="195",addr="0x00002b82562c8f1a",func="start_thread",from="/lib/libpthread.so.0"},frame={level="196",addr="0x00002b82564a1602",func="clone",from="/lib/libc.so.6"},frame={level="197",addr="0x0000000000000000",func="??"}]'
-    obj = parseGdbMi(input)
+    obj = parseAndRecord(input)
 
     skipUnknownFrames = True
     lastIsKnown = True
@@ -172,3 +596,92 @@ if __name__ == '__main__':
     print '\n'.join(lines)
 
     
+
+    print '============='
+    def toComparable(obj):
+        if isinstance(obj, GdbMiResult):
+            return dict((k, toComparable(v)) for (k, v) in obj.__dict__.items())
+        if type(obj) is types.ListType or isinstance(obj, MiLazyList):
+            return [toComparable(v) for v in obj]
+        return (type(obj), obj)
+
+    # A few corner cases which the records above do not exercise.
+    samples += [
+        r'^done,value="\\",name="a\\\"b",empty="",list=["1","x",{}],nested=[[],[{a="2"}]],tup={}',
+        r'^error,msg="No symbol \"foo\" in current context."',
+        r'^done,threads=[{id="1",frame={level="0",args=[{name="argc",value="1"}]}}],current-thread-id="1"',
+        r'^done,stack=[frame={func="a}]{[\"",args=[{name="x",value="{1, 2}"}]},frame={level="2"}],x=[]',
+    ]
+
+    def typedMatches(expected, actual):
+        """
+        Returns True if the typed object holds what the pyparsing grammar
+        made of the same record. Typed ints stand for the strings of
+        digits (or hex addresses) the grammar leaves alone, and typed
+        strings are unescaped.
+        """
+        if isinstance(actual, MiRecord):
+            fields = dict(actual._extra) if hasattr(actual, '_extra') else {}
+            for slot in type(actual).__slots__:
+                try:
+                    fields[type(actual).miNames.get(slot, slot)] = object.__getattribute__(actual, slot)
+                except AttributeError:
+                    pass
+            actual = fields
+        elif isinstance(actual, MiListItem):
+            actual = {actual[0]: actual[1]}
+        elif isinstance(actual, GdbMiResult):
+            actual = actual.__dict__
+
+        if isinstance(expected, GdbMiResult):
+            expected = expected.__dict__
+        if type(expected) is types.DictType:
+            return type(actual) is types.DictType and \
+                    sorted(expected.keys()) == sorted(actual.keys()) and \
+                    all(typedMatches(expected[k], actual[k]) for k in expected)
+        if type(expected) is types.ListType:
+            actual = list(actual)
+            return len(expected) == len(actual) and \
+                    all(typedMatches(e, a) for (e, a) in zip(expected, actual))
+        if type(actual) is types.IntType and type(expected) is types.StringType:
+            try:
+                return int(expected, 0) == actual
+            except ValueError:
+                return False
+        if type(expected) is types.IntType and type(actual) is types.StringType:
+            return str(expected) == actual
+        if type(expected) is types.StringType and type(actual) is types.StringType:
+            return expected == actual or expected.decode('string_escape') == actual
+        return expected == actual
+
+    # Records which go through the typed classes, including values with
+    # escapes which have to stay escaped.
+    typedSamples = [
+        r'^done,changelist=[{name="var1.s",value="0x601040 \"a\\nb\"",in_scope="true",type_changed="false",has_more="0"}]',
+        r'^done,numchild="1",children=[child={name="var1.s",exp="s",numchild="0",value="\"x\\ty\"",type="std::string",thread-id="1"}],has_more="0"',
+        r'^done,stack=[frame={level="0",addr="0x00000000004005b4",func="main",file="a \"b\".c",fullname="/tmp/a.c",line="3",arch="i386:x86-64",args=[{name="s",value="0x0"}]}]',
+    ]
+    samples += typedSamples
+
+    numFailed = 0
+    for input in samples:
+        expected = toComparable(parseGdbMiPyparsing(input))
+        actual = toComparable(parseGdbMi(input))
+        lazy = toComparable(parseGdbMi(input, lazy=True))
+        reference = parseGdbMiPyparsing(input)
+        typed = typedMatches(reference, parseGdbMi(input, typed=True)) and \
+                typedMatches(reference, parseGdbMi(input, typed=True, lazy=True))
+        if expected != actual or expected != lazy or not typed:
+            print 'MISMATCH for %s' % input
+            numFailed += 1
+
+    # A whole record decoded into a typed class.
+    input = r'^done,name="var1",numchild="0",value="\"a\\nb\"",type="char *",thread-id="1",has_more="0"'
+    if not typedMatches(parseGdbMiPyparsing(input), parseGdbMi(input, recordType=MiVarObj)):
+        print 'MISMATCH for %s' % input
+        numFailed += 1
+    samples.append(input)
+
+    print '%d of %d samples match the pyparsing grammar' % (len(samples) - numFailed, len(samples))
+    if numFailed:
+        sys.exit(1)
@@ -0,0 +1,410 @@
+"""
+A daemon which keeps GDBs around with the symbols of recently debugged
+programs already loaded.
+
+Loading the symbols of a large program takes GDB a long time and we
+restart the same program many times a day. Whenever we are asked for a
+GDB for a program, we hand out a spare one which has been loading the
+program since the last time (or a fresh one if there is none) and start a
+new spare for the next time. Spares are keyed by the path, modification
+time and size of the program, so a rebuilt program never gets a GDB with
+stale symbols, and by the options the GDB was started with. Log files
+are only given to a GDB once it is handed out.
+
+Every GDB comes with its own GdbServer listening on its own socket, so a
+client talks to a GDB from the pool exactly as it would to one it started
+itself. Spares which have not been asked for in a while, or which would
+make the spares use more memory than we are allowed, are killed. The
+daemon goes away once it has no GDBs left.
+
+    python GdbPool.py [--memory-budget MB] [--idle-timeout SECONDS]
+
+The daemon listens on the Unix domain socket getPoolAddress(). Clients
+use getPooledServerAddress(), which also starts the daemon if it is not
+running.
+"""
+
+from GdbServer import GdbServer
+from GdbClient import GdbClient
+from sockutils import *
+
+import os
+import time
+import errno
+import socket
+import select
+import pipes
+import threading
+import logging
+from subprocess import Popen
+
+def getPoolAddress():
+    return os.path.join(getSocketDir(), 'pool')
+
+def getProgramKey(gdbcmd, program, useMiChannel=True, programTty=False):
+    """
+    Returns what identifies a GDB which has loaded the given program and
+    was started with the given options.
+    """
+    program = os.path.realpath(program)
+    st = os.stat(program)
+    return (gdbcmd, program, useMiChannel, programTty, st.st_mtime, st.st_size)
+
+class PooledGdb:
+    """
+    A GdbServer running in a thread of its own.
+    """
+    def __init__(self, key):
+        self.key = key
+        (gdbcmd, program, useMiChannel, programTty, mtime, size) = key
+        self.server = GdbServer('%s %s' % (gdbcmd, pipes.quote(program)),
+                                useMiChannel, programTty=programTty)
+        # When we were last asked for this program. See GdbPool.reclaim().
+        self.lastUsed = time.time()
+        # When the client of a session went away without telling us.
+        self.orphanedSince = None
+        self.thread = threading.Thread(target=self.server.run)
+        self.thread.setDaemon(True)
+        self.thread.start()
+
+    def getAddress(self):
+        return self.server.getAddress()
+
+    def setLogs(self, programLog, outputLog):
+        """
+        Has the server write its logs to the given files. Only done once we
+        are handed out, so that a spare does not clobber the logs of the
+        session it is a spare for.
+        """
+        if outputLog:
+            self.server.outputForClient.openLog(outputLog)
+        if programLog and self.server.inferiorTty:
+            self.server.inferiorTty.output.openLog(programLog)
+
+    def isAlive(self):
+        return self.thread.isAlive()
+
+    def getMemoryUsage(self):
+        """
+        Returns how many bytes of memory GDB is using.
+        """
+        try:
+            resident = int(open('/proc/%d/statm' % self.server.shell.pid).read().split()[1])
+        except (IOError, ValueError, IndexError):
+            return 0
+        return resident * os.sysconf('SC_PAGE_SIZE')
+
+    def terminate(self):
+        PoolClient(self.getAddress()).getReply('DIE')
+        self.thread.join()
+
+class GdbPool:
+    def __init__(self, memoryBudget=4096*1024*1024, idleTimeout=3600, exitDelay=60):
+        self.memoryBudget = memoryBudget
+        self.idleTimeout = idleTimeout
+        # How long we stay around without any GDBs.
+        self.exitDelay = exitDelay
+        self.lastRequest = time.time()
+        # Spare GDBs keyed by program, at most one for each.
+        self.spares = {}
+        # GDBs which we have handed out.
+        self.sessions = []
+
+        self.logger = logging.getLogger('VimGdb.Pool')
+
+        self.socket = self.makeSocket()
+
+    def makeSocket(self):
+        """
+        Returns a socket bound to getPoolAddress(), or None if another pool
+        is already listening there.
+        """
+        try:
+            return makeListeningSocket(name='pool')
+        except socket.error, (en, msg):
+            if en != errno.EADDRINUSE:
+                raise
+
+        try:
+            connectTo(getPoolAddress()).close()
+            return None
+        except socket.error:
+            pass
+
+        # Left behind by a pool which did not get to clean up.
+        os.remove(getPoolAddress())
+        return makeListeningSocket(name='pool')
+
+    def debug(self, msg):
+        self.logger.debug(msg)
+
+    def exception(self, msg):
+        self.logger.exception(msg)
+
+    def getServerAddress(self, gdbcmd, program, useMiChannel=True, programTty=False,
+                         programLog='', outputLog=''):
+        """
+        Returns the address of a GdbServer for a GDB which has loaded the
+        given program, or is busy loading it.
+        """
+        key = getProgramKey(gdbcmd, program, useMiChannel, programTty)
+
+        for (oldKey, gdb) in self.spares.items():
+            if oldKey[:2] != key[:2]:
+                continue
+            # Spares for an older build of the program are of no use
+            # anymore.
+            if oldKey[4:] != key[4:]:
+                self.debug('dropping spare for old build of %s' % program)
+                self.spares.pop(oldKey).terminate()
+            else:
+                gdb.lastUsed = time.time()
+
+        gdb = self.spares.pop(key, None)
+        if gdb is None:
+            self.debug('no spare for %s, starting one' % program)
+            gdb = PooledGdb(key)
+        else:
+            self.debug('handing out spare for %s' % program)
+        gdb.lastUsed = time.time()
+        gdb.setLogs(programLog, outputLog)
+        self.sessions.append(gdb)
+
+        # Get ready for the next time we are asked.
+        self.spares[key] = PooledGdb(key)
+        return gdb.getAddress()
+
+    def reclaim(self):
+        """
+        Forgets about finished sessions and kills spares we cannot afford
+        to keep around.
+        """
+        now = time.time()
+        for gdb in self.sessions:
+            if gdb.server.connections:
+                gdb.orphanedSince = None
+            elif gdb.orphanedSince is None:
+                gdb.orphanedSince = now
+            elif now - gdb.orphanedSince > self.idleTimeout:
+                self.debug('dropping session for %s nobody is connected to' % gdb.key[1])
+                gdb.terminate()
+        self.sessions = [gdb for gdb in self.sessions if gdb.isAlive()]
+
+        for (key, gdb) in self.spares.items():
+            if not gdb.isAlive() or now - gdb.lastUsed > self.idleTimeout:
+                self.debug('dropping idle spare for %s' % key[1])
+                self.spares.pop(key).terminate()
+
+        # Drop the least recently used spares till the rest fit.
+        spares = self.spares.values()
+        spares.sort(key=lambda gdb: gdb.lastUsed)
+        usage = [gdb.getMemoryUsage() for gdb in spares]
+        total = sum(usage)
+        while spares and total > self.memoryBudget:
+            gdb = spares.pop(0)
+            total -= usage.pop(0)
+            self.debug('dropping spare for %s to save memory' % gdb.key[1])
+            del self.spares[gdb.key]
+            gdb.terminate()
+
+    def isIdle(self):
+        return not (self.sessions or self.spares) and \
+                time.time() - self.lastRequest > self.exitDelay
+
+    def run(self, reclaimInterval=10):
+        self.socket.listen(5)
+        while not self.isIdle():
+            try:
+                r, w, e = select.select([self.socket], [], [], reclaimInterval)
+            except select.error, (en, msg):
+                if en == errno.EINTR:
+                    continue
+                raise
+
+            if r:
+                self.lastRequest = time.time()
+                sock, addr = self.socket.accept()
+                conn = MsgConnection(sock)
+                try:
+                    try:
+                        if not self.serveConnection(conn):
+                            break
+                    except Exception:
+                        # One broken client must not take the GDBs of
+                        # everybody else with it.
+                        self.exception('Exception in serving a connection')
+                finally:
+                    conn.close()
+
+            self.reclaim()
+
+        self.debug('shutting down')
+        closeListeningSocket(self.socket)
+        for gdb in self.spares.values():
+            gdb.terminate()
+        self.spares = {}
+
+    def serveConnection(self, conn):
+        """
+        Answers the requests of a client till it disconnects. Returns
+        False if the client asked us to go away.
+        """
+        while 1:
+            msg = conn.readMsg()
+            if msg is None:
+                return True
+
+            tag, mode, payload = msg
+            try:
+                if not self.serveRequest(conn, tag, mode, payload):
+                    return False
+            except socket.error:
+                raise
+            except Exception, e:
+                self.exception('Exception in handling request %s' % mode)
+                conn.sendMsg(tag, 'END', 'ERROR %s' % e)
+
+    def serveRequest(self, conn, tag, mode, payload):
+        """
+        Answers a single request. Returns False if the client asked us to
+        go away.
+        """
+        if mode == 'GET':
+            # payload is the GDB command and the program on two lines,
+            # followed by a name=value line for each option of
+            # getServerAddress().
+            try:
+                address = self.getServerAddress(*parseGetRequest(payload))
+            except (OSError, TypeError, ValueError), e:
+                conn.sendMsg(tag, 'END', 'ERROR %s' % e)
+                return True
+            conn.sendMsg(tag, 'DATA', str(address))
+            conn.sendMsg(tag, 'END', '')
+        elif mode == 'STATUS':
+            lines = ['spare %s %s %d\n' % (gdb.key[1], gdb.getAddress(), gdb.getMemoryUsage())
+                     for gdb in self.spares.values()]
+            lines += ['session %s %s\n' % (gdb.key[1], gdb.getAddress())
+                      for gdb in self.sessions if gdb.isAlive()]
+            conn.sendMsg(tag, 'DATA', ''.join(lines))
+            conn.sendMsg(tag, 'END', '')
+        elif mode == 'DIE':
+            conn.sendMsg(tag, 'END', 'BYE')
+            return False
+        else:
+            conn.sendMsg(tag, 'END', 'WRONG_MODE')
+        return True
+
+def parseGetRequest(payload):
+    """
+    Returns the arguments of getServerAddress() for a GET request.
+    """
+    lines = payload.split('\n')
+    if len(lines) < 2:
+        raise ValueError, 'GET needs a GDB command and a program'
+    options = dict(line.split('=', 1) for line in lines[2:] if line)
+    return (lines[0], lines[1],
+            options.get('useMiChannel', '1') == '1',
+            options.get('programTty', '0') == '1',
+            options.get('programLog', ''),
+            options.get('outputLog', ''))
+
+class PoolClient(GdbClient):
+    """
+    Talks to the pool, or to one of its servers, and keeps what it is told
+    instead of printing it.
+    """
+    def __init__(self, address):
+        GdbClient.__init__(self, address)
+        self.data = []
+
+    def getLoggerName(self):
+        return 'VimGdb.PoolClient'
+
+    def onNewData(self, data):
+        self.data.append(data)
+
+    def onRequestError(self, status):
+        # Our callers look at replyStatus.
+        self.debug('request failed: %s' % status)
+
+    def request(self, input):
+        self.data = []
+        self.getReply(input)
+        return ''.join(self.data)
+
+def startPool(memoryBudgetMB):
+    """
+    Starts the pool daemon in a session of its own so that it outlives us.
+    """
+    devnull = open(os.devnull, 'r+')
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'GdbPool.py')
+    Popen(['python', script, '--memory-budget', str(memoryBudgetMB)],
+          stdin=devnull, stdout=devnull, stderr=devnull,
+          close_fds=True, preexec_fn=os.setsid)
+
+def getPooledServerAddress(gdbcmd, program, memoryBudgetMB=4096, timeout=2.0,
+                           useMiChannel=True, programTty=False,
+                           programLog='', outputLog=''):
+    """
+    Returns the address of a GdbServer for the given program from the pool,
+    started with the given options, starting the pool if need be. Returns
+    None if the pool cannot give us one, in which case the caller should
+    start a GDB itself.
+    """
+    if not os.path.exists(program):
+        return None
+
+    startedPool = False
+    endTime = time.time() + timeout
+    while time.time() < endTime:
+        if os.path.exists(getPoolAddress()):
+            client = PoolClient(getPoolAddress())
+            try:
+                client.connect()
+            except RuntimeError:
+                client = None
+            if client:
+                reply = client.request('GET %s\n%s\nuseMiChannel=%d\nprogramTty=%d\n'
+                                       'programLog=%s\noutputLog=%s'
+                                       % (gdbcmd, program, useMiChannel, programTty,
+                                          programLog, outputLog))
+                client.disconnect()
+                if client.replyStatus or not reply:
+                    return None
+                return parseAddress(reply)
+
+        if not startedPool:
+            startPool(memoryBudgetMB)
+            startedPool = True
+        time.sleep(0.05)
+
+    return None
+
+def main():
+    from optparse import OptionParser
+
+    parser = OptionParser()
+    parser.add_option('-d', '--debug', dest='debug', action='store_true', default=False)
+    parser.add_option('', '--memory-budget', dest='memoryBudget', type='int', default=4096,
+                      help='MB of memory the spare GDBs may use between them')
+    parser.add_option('', '--idle-timeout', dest='idleTimeout', type='int', default=3600,
+                      help='seconds after which a spare nobody asked for is killed')
+    (opts, args) = parser.parse_args()
+
+    if opts.debug:
+        logger = logging.getLogger('VimGdb')
+        handler = logging.FileHandler('/tmp/GdbPool.%s.log' % (os.getenv('USER')))
+        formatter = logging.Formatter("%(asctime)s %(levelname)-8s %(name)s %(message)s")
+        handler.setFormatter(formatter)
+        logger.addHandler(handler)
+        logger.setLevel(logging.DEBUG)
+
+    pool = GdbPool(opts.memoryBudget*1024*1024, opts.idleTimeout)
+    # Somebody else started a pool just before us.
+    if pool.socket is None:
+        return
+
+    pool.run()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,209 @@
+"""
+Recording and replaying GDB sessions.
+
+A GdbServer given a SessionRecorder writes down everything which goes to
+and comes from GDB, on the console as well as on the MI channel, with the
+time at which it happened. Running this module on such a recording gives a
+program which behaves enough like that GDB to stand in for it:
+
+    python GdbReplay.py [--speed N] session.rec [gdb arguments]
+
+Whenever it is sent a command which was recorded, it says what GDB said in
+reply, taking as long as GDB took multiplied by the speed factor. Commands
+which were sent several times get the recorded replies in turn. This lets
+us measure the client and server without a GDB or a program to debug.
+"""
+
+import os
+import sys
+import re
+import time
+import threading
+
+class SessionRecorder:
+    """
+    Writes events to a file, one per line:
+
+        <seconds since start> <stream> <data escaped with string_escape>
+
+    The streams are 'in' and 'out' for the annotated console and 'mi-in'
+    and 'mi-out' for the MI channel. MI commands are recorded without
+    their tokens and every MI output line is recorded separately, with the
+    token taken off result records.
+    """
+    def __init__(self, fileName):
+        self.file = open(fileName, 'w')
+        self.lock = threading.Lock()
+        self.startTime = time.time()
+
+    def record(self, stream, data, when=None):
+        if when is None:
+            when = time.time() - self.startTime
+
+        self.lock.acquire()
+        try:
+            self.file.write('%.6f %s %s\n' % (when, stream, data.encode('string_escape')))
+            self.file.flush()
+        finally:
+            self.lock.release()
+
+    def close(self):
+        self.file.close()
+
+def readSession(fileName):
+    """
+    Returns the list of (time, stream, data) events recorded in the given
+    file.
+    """
+    events = []
+    for line in open(fileName):
+        when, stream, data = line.rstrip('\n').split(' ', 2)
+        events.append((float(when), stream, data.decode('string_escape')))
+    return events
+
+class SessionPlayer:
+    """
+    Replies to commands with what was recorded for them.
+
+    Console output is split into the banner GDB prints at startup and one
+    reply for every command, made up of the output which came after the
+    command and before the next one. Each piece of output remembers how
+    long after the previous event it arrived.
+    """
+
+    unknownReply = ('\r\n\x1a\x1apost-prompt\r\n'
+                    '\r\n\x1a\x1aerror-begin\r\nUndefined command: "%s".\r\n\x1a\x1aerror\r\n'
+                    '\r\n\x1a\x1apre-prompt\r\n(gdb) \r\n\x1a\x1aprompt\r\n')
+
+    def __init__(self, events, speed=1.0):
+        self.speed = speed
+        self.banner = []
+        self.replies = {}
+        self.miReplies = {}
+        self.numPlayed = {}
+
+        lastTime = 0.0
+        current = self.banner
+        miQueue = []
+        miLines = []
+        for (when, stream, data) in events:
+            delay = max(0.0, when - lastTime)
+            lastTime = when
+            if stream == 'in':
+                current = []
+                self.replies.setdefault(data.rstrip('\n'), []).append(current)
+            elif stream == 'out':
+                current.append((delay, data))
+            elif stream == 'mi-in':
+                miQueue.append(data)
+            elif stream == 'mi-out':
+                miLines.append((delay, data))
+                if data.startswith('^') and miQueue:
+                    self.miReplies.setdefault(miQueue.pop(0), []).append(miLines)
+                    miLines = []
+
+    def nextReply(self, replies, cmd):
+        # Commands sent more than once get the recorded replies in turn.
+        n = self.numPlayed.get(cmd, 0)
+        self.numPlayed[cmd] = n + 1
+        return replies[cmd][n % len(replies[cmd])]
+
+    def wait(self, delay):
+        if delay and self.speed:
+            time.sleep(delay * self.speed)
+
+    def play(self, output, fd):
+        for (delay, data) in output:
+            self.wait(delay)
+            os.write(fd, data)
+
+    def playBanner(self, fd):
+        self.play(self.banner, fd)
+
+    def playReply(self, cmd, fd):
+        if cmd in self.replies:
+            self.play(self.nextReply(self.replies, cmd), fd)
+        else:
+            os.write(fd, self.unknownReply % cmd.split(' ')[0])
+
+    def getMiReply(self, cmd, token):
+        """
+        Returns the MI output for the command, with the token put back on
+        the result record.
+        """
+        if cmd not in self.miReplies:
+            return ['%s^error,msg="Command %s was not recorded"' % (token, cmd), '(gdb) ']
+
+        lines = []
+        for (delay, line) in self.nextReply(self.miReplies, cmd):
+            self.wait(delay)
+            if line.startswith('^'):
+                line = token + line
+            lines.append(line)
+        lines.append('(gdb) ')
+        return lines
+
+def serveMiChannel(player, ttyName):
+    fd = os.open(ttyName, os.O_RDWR)
+    os.write(fd, '(gdb) \n')
+    tokenPat = re.compile(r'(\d*)(.*)$')
+    partial = ''
+    while 1:
+        try:
+            data = os.read(fd, 65536)
+        except OSError:
+            break
+        if not data:
+            break
+
+        lines = (partial + data).split('\n')
+        partial = lines.pop()
+        for line in lines:
+            m = tokenPat.match(line.rstrip('\r'))
+            reply = player.getMiReply(m.group(2), m.group(1))
+            os.write(fd, ''.join([l + '\n' for l in reply]))
+
+def main(args):
+    from optparse import OptionParser
+
+    parser = OptionParser(usage='%prog [--speed N] session.rec [gdb arguments]')
+    parser.add_option('', '--speed', dest='speed', type='float', default=1.0,
+                      help='multiply recorded delays by this, 0 to not wait at all')
+    # We are started in place of GDB, so we get its arguments as well.
+    parser.disable_interspersed_args()
+    (opts, args) = parser.parse_args(args)
+    if not args:
+        parser.error('no recording given')
+
+    player = SessionPlayer(readSession(args[0]), opts.speed)
+
+    # The recording has what came out of the terminal, including the echo
+    # of every command and the carriage returns the terminal added. Do not
+    # let the terminal add them a second time.
+    if os.isatty(0):
+        import termios
+        attrs = termios.tcgetattr(0)
+        attrs[1] = attrs[1] & ~termios.OPOST
+        attrs[3] = attrs[3] & ~termios.ECHO
+        termios.tcsetattr(0, termios.TCSANOW, attrs)
+
+    for i in range(len(args) - 1):
+        if args[i] == '-ex' and args[i+1].startswith('new-ui mi2 '):
+            t = threading.Thread(target=serveMiChannel,
+                                 args=(player, args[i+1].split(' ')[2]))
+            t.setDaemon(True)
+            t.start()
+
+    out = sys.stdout.fileno()
+    player.playBanner(out)
+    while 1:
+        line = sys.stdin.readline()
+        if not line:
+            break
+        cmd = line.rstrip('\r\n')
+        if cmd in ('quit', 'q'):
+            break
+        player.playReply(cmd, out)
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
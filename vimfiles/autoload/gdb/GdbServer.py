@@ -1,52 +1,294 @@
 from TerminalServer import TerminalServer
+from MiChannel import MiChannel
+from InferiorTty import InferiorTty
 
 import logging
 import sys
-import re
+
+class AnnotationScanner:
+    """
+    Picks out the annotations GDB prints with --annotate=3 from its output
+    as the output arrives. Every annotation sits on a line of its own and
+    starts with two ^Z characters, so we only ever look at the bytes around
+    those and never rescan output we have already seen.
+    """
+
+    # The annotations after which GDB sits waiting for us to type
+    # something.
+    inputAnnotations = ('query', 'commands', 'prompt-for-continue')
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.partial = ''
+        self.promptArrived = False
+        self.waitingFor = None
+        self.inQuery = False
+        self.queryParts = []
+        self.query = ''
+
+    def feed(self, data):
+        if self.partial:
+            data = self.partial + data
+            self.partial = ''
+
+        # GDB waits for input right after it prints one of the input
+        # annotations, so it only counts if nothing follows it.
+        if data:
+            self.waitingFor = None
+
+        pos = 0
+        while 1:
+            start = data.find('\x1a\x1a', pos)
+            if start == -1:
+                rest = data[pos:]
+                # The first ^Z of an annotation might have arrived without
+                # the second one.
+                if rest.endswith('\x1a'):
+                    rest = rest[:-1]
+                    self.partial = '\x1a'
+                if self.inQuery:
+                    self.queryParts.append(rest)
+                return
+
+            if self.inQuery:
+                self.queryParts.append(data[pos:start])
+
+            end = data.find('\n', start)
+            if end == -1:
+                # Wait for the rest of the annotation line.
+                self.partial = data[start:]
+                return
+
+            pos = end + 1
+            self.onAnnotation(data[start+2:end].rstrip('\r').split(' ', 1)[0], pos == len(data))
+
+    def onAnnotation(self, name, isLast):
+        if name == 'prompt':
+            self.promptArrived = True
+        elif name == 'pre-query':
+            self.inQuery = True
+            self.queryParts = []
+        elif name == 'query':
+            self.inQuery = False
+            self.query = ''.join(self.queryParts).strip('\r\n')
+
+        if isLast and name in self.inputAnnotations:
+            self.waitingFor = name
 
 class GdbServer(TerminalServer):
-    def __init__(self, cmd='gdb'):
-        TerminalServer.__init__(self, cmd + ' --annotate=3')
+    def __init__(self, cmd='gdb', useMiChannel=True, recorder=None, useTcp=False,
+                 programTty=False, programLog=None, outputLog=None):
+        self.annotations = AnnotationScanner()
+
+        # Structured queries go over a separate MI channel which GDB opens
+        # right at startup.
+        self.miChannel = None
+        if useMiChannel:
+            self.miChannel = MiChannel(recorder)
+            cmd += " -ex '%s'" % self.miChannel.getStartupCommand()
+
+        # The program gets a terminal of its own, so that however much it
+        # prints, GDB's terminal only carries what GDB says.
+        self.inferiorTty = None
+        if programTty:
+            self.inferiorTty = InferiorTty(programLog, onOutput=self.onProgramOutput)
+            cmd += " -ex '%s'" % self.inferiorTty.getStartupCommand()
+
         self.queryAnswer = ''
-        self.queryPat = re.compile(r'pre-query\r\n(?P<query>.*)\r\nquery', re.DOTALL)
+        # The result of the last -stack-info-frame, as long as nothing can
+        # have changed it. See handleControlCmd().
+        self.frameRecord = ''
+        TerminalServer.__init__(self, cmd + ' --annotate=3', recorder, useTcp, outputLog)
 
     def getLoggerName(self):
         return 'VimGdb.Server'
 
     def isValidMode(self, mode):
-        return (mode == 'SETQA')
+        return mode in ('SETQA', 'MI', 'SNAPSHOT', 'FRAME', 'PROGOUT', 'PROGIN')
 
-    def handleCmd(self, mode, cmd):
+    def handleControlCmd(self, conn, tag, mode, cmd):
         if mode == 'SETQA':
             self.queryAnswer = cmd
+            self.endReply(conn, tag, '')
+            return True
+        elif mode == 'FRAME':
+            # Lets a client find out where the program is without waiting
+            # for a command GDB might be busy with.
+            conn.sendMsg(tag, 'DATA', self.frameRecord)
+            self.endReply(conn, tag, '')
+            return True
+        elif mode in ('PROGOUT', 'PROGIN'):
+            if self.inferiorTty is None:
+                self.endReply(conn, tag, 'NOTTY')
+            elif mode == 'PROGOUT':
+                self.sendProgramOutput(conn, tag)
+            else:
+                self.inferiorTty.write(cmd)
+                self.endReply(conn, tag, '')
+            return True
+
+    def sendProgramOutput(self, conn, tag):
+        conn.sendMsg(tag, 'DATA', self.inferiorTty.takeOutput())
+        self.endReply(conn, tag, '')
+
+    def handleCmd(self, conn, tag, mode, cmd):
+        if mode == 'MI':
+            self.runMiCommands(conn, tag, cmd)
+            return True
+        elif mode == 'SNAPSHOT':
+            self.takeSnapshot(conn, tag, cmd)
+            return True
+
+        if not cmd.startswith(self.frameKeepingPrefixes):
+            self.frameRecord = ''
+
+    # Commands after which the frame is still what it was.
+    frameKeepingPrefixes = ('-stack-info-frame', '-stack-list-', '-var-', '-data-', 'info ')
 
-    def hasPromptArrived(self, data):
-        return data.endswith('prompt\r\n')
+    def noteResults(self, cmds, records):
+        """
+        Keeps the result of -stack-info-frame for FRAME requests.
+        """
+        for (cmd, record) in zip(cmds, records):
+            if cmd == '-stack-info-frame' and record.startswith('^done'):
+                self.frameRecord = record
+            elif not cmd.startswith(self.frameKeepingPrefixes):
+                self.frameRecord = ''
 
-    def needsUserInput(self, data):
-        return (data.endswith('query\r\n') or
-                data.endswith('commands\r\n') or
-                data.endswith('prompt-for-continue\r\n'))
+    def runMiCommands(self, conn, tag, cmds):
+        """
+        Runs the newline separated MI commands over the MI channel and
+        sends back their result records, one per line.
+        """
+        if self.miChannel is None:
+            self.endReply(conn, tag, 'NOMI')
+            return
 
-    def getUserInput(self, data):
-        if data.endswith('query\r\n'):
-            m = self.queryPat.search(data)
-            query = m.group('query')
-            return self.getQueryAnswer(query)
+        if self.isBusy():
+            self.endReply(conn, tag, 'BUSY')
+            return
 
-        if data.endswith('commands\r\n'):
+        cmds = cmds.split('\n')
+        results = self.miChannel.execute(cmds)
+        self.noteResults(cmds, results)
+        conn.sendMsg(tag, 'DATA', ''.join([r + '\n' for r in results]))
+        self.endReply(conn, tag, '')
+
+    def takeSnapshot(self, conn, tag, cmds):
+        """
+        Collects everything the client wants to know after the program
+        stops in one go. cmds is a newline separated list of MI commands
+        (which start with "-") and console commands. For every command we
+        send back a line containing its result record and its console
+        output (escaped to fit on the line) separated by a tab.
+        """
+        if self.isBusy():
+            self.endReply(conn, tag, 'BUSY')
+            return
+
+        cmds = cmds.split('\n')
+        if self.miChannel:
+            miCmds = []
+            for cmd in cmds:
+                if not cmd.startswith('-'):
+                    cmd = '-interpreter-exec console "%s"' % cmd.replace('\\', '\\\\').replace('"', '\\"')
+                miCmds.append(cmd)
+            results = self.miChannel.execute(miCmds, withConsoleOutput=True)
+        else:
+            results = [self.runSilently(cmd) for cmd in cmds]
+        self.noteResults(cmds, [record for (record, output) in results])
+
+        lines = ['%s\t%s\n' % (record, output.encode('string_escape'))
+                 for (record, output) in results]
+        conn.sendMsg(tag, 'DATA', ''.join(lines))
+        self.endReply(conn, tag, '')
+
+    def runSilently(self, cmd):
+        """
+        Runs a command on the console without the client seeing its output
+        and returns a (result record, console output) pair like the MI
+        channel does.
+        """
+        savedData = self.outputForClient.savePending()
+        try:
+            if cmd.startswith('-'):
+                out = self.getReply('interpreter mi "%s"' % cmd)
+                for line in out.splitlines():
+                    if line.startswith('^'):
+                        return (line, '')
+                return ('^error,msg="No result record"', '')
+            else:
+                return ('^done', self.getReply(cmd))
+        finally:
+            self.outputForClient.restorePending(savedData)
+
+    def readStartupOutput(self):
+        out = TerminalServer.readStartupOutput(self)
+
+        # GDB opens the MI channel before its first prompt, so we have
+        # usually seen the MI prompt already.
+        if self.miChannel and not self.miChannel.waitUntilReady(1.0):
+            self.debug('GDB did not open the MI channel, falling back to "interpreter mi"')
+            self.miChannel.close()
+            self.miChannel = None
+        return out
+
+    def getExtraReadFds(self):
+        if self.miChannel:
+            return [self.miChannel.fileno()]
+        return []
+
+    def onExtraFdReadable(self, fd):
+        self.miChannel.drain()
+
+    def resetOutputState(self):
+        self.annotations.reset()
+
+    def feedOutput(self, data):
+        self.annotations.feed(data)
+
+    def hasPromptArrived(self):
+        return self.annotations.promptArrived
+
+    def needsUserInput(self):
+        return self.annotations.waitingFor is not None
+
+    def getUserInput(self):
+        waitingFor = self.annotations.waitingFor
+        if waitingFor == 'query':
+            return self.getQueryAnswer(self.annotations.query)
+
+        if waitingFor == 'commands':
             return 'end'
 
-        if data.endswith('prompt-for-continue\r\n'):
+        if waitingFor == 'prompt-for-continue':
             return ''
 
         assert False, 'Illegal data input for getUserInput'
 
     def getQueryAnswer(self, query):
-        return 'y'
+        ans = self.askSubscriber('QUERY', query)
+        if ans is None:
+            return 'y'
+        return ans
 
     def onResume(self):
-        pass
+        # Tells the client which stop it should ask about.
+        self.pushEvent('RESUME', str(self.generation))
+
+    def onReady(self):
+        self.pushEvent('READY')
+
+    def onProgramOutput(self):
+        # The client fetches the output with a PROGOUT request when it
+        # gets round to it.
+        return self.pushEvent('PROGOUT')
+
+    def onShutdown(self):
+        if self.inferiorTty:
+            self.inferiorTty.close()
 
 if __name__ == "__main__":
     from optparse import OptionParser
@@ -55,6 +297,17 @@ if __name__ == "__main__":
     parser = OptionParser()
     parser.add_option('-d', '--debug', dest="debug", action="store_true", default=False)
     parser.add_option('', '--gdbcmd', dest="gdbcmd", default="gdb")
+    parser.add_option('', '--no-mi-channel', dest="useMiChannel", action="store_false", default=True)
+    parser.add_option('', '--tcp', dest="useTcp", action="store_true", default=False,
+                      help="listen on a TCP port instead of a Unix domain socket")
+    parser.add_option('', '--program-tty', dest="programTty", action="store_true", default=False,
+                      help="give the program a terminal of its own")
+    parser.add_option('', '--program-log', dest="programLog", default=None,
+                      help="write what the program prints to this file")
+    parser.add_option('', '--output-log', dest="outputLog", default=None,
+                      help="write what GDB says while the program runs to this file")
+    parser.add_option('', '--record', dest="recordFile", default="",
+                      help="write the session to this file for GdbReplay.py")
     (opts, args) = parser.parse_args()
 
     if opts.debug:
@@ -67,6 +320,15 @@ if __name__ == "__main__":
     else:
         logging.basicConfig()
 
-    s = GdbServer(opts.gdbcmd)
+    recorder = None
+    if opts.recordFile:
+        from GdbReplay import SessionRecorder
+        recorder = SessionRecorder(opts.recordFile)
+
+    s = GdbServer(opts.gdbcmd, opts.useMiChannel, recorder, opts.useTcp,
+                  opts.programTty, opts.programLog, opts.outputLog)
+    # What to give GdbClient.py
+    print s.getAddress()
+    sys.stdout.flush()
     s.run()
 
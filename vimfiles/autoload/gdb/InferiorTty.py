@@ -0,0 +1,100 @@
+import os
+import pty
+import select
+import errno
+import threading
+from OutputHistory import OutputHistory
+
+class InferiorTty:
+    """
+    A pseudo-terminal of its own for the program being debugged, which GDB
+    is told about with "set inferior-tty <tty>". Whatever the program
+    prints then never goes through GDB's terminal, so it is neither
+    scanned for annotations nor sent to the client along with the replies
+    to its commands.
+
+    A thread reads the terminal as the program writes to it and keeps the
+    output in an OutputHistory till the client fetches it with
+    takeOutput(). Only the last maxPending bytes are kept for it, so a
+    program which prints a lot cannot make us run out of memory however
+    slow the client is.
+    """
+    def __init__(self, logFileName=None, maxPending=256*1024,
+                 maxLogSize=64*1024*1024, onOutput=None):
+        self.masterFd, self.slaveFd = pty.openpty()
+        self.ttyName = os.ttyname(self.slaveFd)
+
+        self.output = OutputHistory(maxPending, logFileName, maxLogSize,
+                                    'program output')
+
+        self.lock = threading.Lock()
+        # Called when there is output to take and nobody has been told
+        # about it yet. Returns False if there was nobody to tell.
+        self.onOutput = onOutput
+        self.notified = False
+
+        self.stopPipe = os.pipe()
+        self.thread = threading.Thread(target=self.run)
+        self.thread.setDaemon(True)
+        self.thread.start()
+
+    def getStartupCommand(self):
+        return 'set inferior-tty %s' % self.ttyName
+
+    def run(self):
+        while 1:
+            try:
+                r, w, e = select.select([self.masterFd, self.stopPipe[0]], [], [])
+            except select.error, (en, msg):
+                if en == errno.EINTR:
+                    continue
+                raise
+            if self.stopPipe[0] in r:
+                break
+
+            try:
+                data = os.read(self.masterFd, 65536)
+            except OSError:
+                break
+            if not data:
+                break
+            self.onNewData(data)
+
+    def onNewData(self, data):
+        self.output.append(data)
+
+        self.lock.acquire()
+        try:
+            notify = not self.notified
+            self.notified = True
+        finally:
+            self.lock.release()
+
+        if notify and self.onOutput and not self.onOutput():
+            self.notified = False
+
+    def takeOutput(self):
+        """
+        Returns the output since the last call. See OutputHistory.take().
+        """
+        self.lock.acquire()
+        try:
+            self.notified = False
+        finally:
+            self.lock.release()
+        return self.output.take()
+
+    def write(self, data):
+        """
+        Types data on the terminal of the program.
+        """
+        os.write(self.masterFd, data)
+
+    def close(self):
+        os.write(self.stopPipe[1], 'x')
+        self.thread.join()
+        os.close(self.masterFd)
+        os.close(self.slaveFd)
+        for fd in self.stopPipe:
+            os.close(fd)
+        self.output.close()
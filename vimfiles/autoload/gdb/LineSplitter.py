@@ -0,0 +1,40 @@
+class LineSplitter:
+    """
+    Splits text which arrives in arbitrary pieces into lines. Every
+    complete line is handed out exactly once by feed(). The incomplete
+    line at the end of a piece is kept aside till the rest of it arrives,
+    so nothing is ever split twice however long the output gets.
+    """
+    def __init__(self):
+        self.partial = []
+
+    def feed(self, data):
+        """
+        Returns the list of lines which data completes, without their line
+        endings.
+        """
+        end = data.rfind('\n')
+        if end < 0:
+            self.partial.append(data)
+            return []
+
+        self.partial.append(data[:end])
+        complete = ''.join(self.partial)
+        rest = data[end+1:]
+        if rest:
+            self.partial = [rest]
+        else:
+            self.partial = []
+
+        return complete.splitlines()
+
+    def reset(self):
+        self.partial = []
+
+if __name__ == "__main__":
+    splitter = LineSplitter()
+    lines = []
+    for piece in ['a\r', '\nbc', 'd', '\r\n\r\ne\r\nf', '\n']:
+        lines += splitter.feed(piece)
+    print lines
+    assert lines == ['a', 'bcd', '', 'e', 'f']
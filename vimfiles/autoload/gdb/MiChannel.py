@@ -0,0 +1,161 @@
+import os
+import pty
+import tty
+import select
+import errno
+import re
+import time
+import threading
+from GdbMiParser import cUnescape
+
+class MiChannel:
+    """
+    A dedicated GDB/MI channel to a GDB which is otherwise driven through
+    its annotated console. We create a pseudo-terminal and ask GDB to start
+    an MI interpreter on it with "new-ui mi2 <tty>". Every command we send
+    on it is prefixed with a token and GDB prefixes the result record with
+    the same token, so results are matched to their commands without ever
+    having to wade through the console transcript.
+    """
+
+    resultPat = re.compile(r'(\d+)(\^.*)$')
+
+    def __init__(self, recorder=None):
+        self.masterFd, self.slaveFd = pty.openpty()
+        # We do not want the terminal to echo our commands back at us or
+        # to mangle line endings.
+        tty.setraw(self.slaveFd)
+        self.ttyName = os.ttyname(self.slaveFd)
+
+        self.lock = threading.RLock()
+        self.nextToken = 1
+        self.partial = ''
+        self.promptSeen = False
+        self.results = {}
+        self.consoleParts = []
+        self.recorder = recorder
+
+    def getStartupCommand(self):
+        return 'new-ui mi2 %s' % self.ttyName
+
+    def fileno(self):
+        return self.masterFd
+
+    def close(self):
+        os.close(self.masterFd)
+        os.close(self.slaveFd)
+
+    def waitUntilReady(self, timeout):
+        """
+        Returns True if GDB shows us an MI prompt on the channel within the
+        given time. Older GDBs do not know about new-ui and will never do
+        so.
+        """
+        endTime = time.time() + timeout
+        while not self.promptSeen:
+            remaining = endTime - time.time()
+            if remaining <= 0 or not self.readSome(remaining):
+                return False
+        return True
+
+    def readSome(self, timeout=None):
+        """
+        Reads whatever GDB has written to the channel, waiting at most
+        timeout seconds for something to show up. Returns False if nothing
+        was read.
+        """
+        try:
+            r, w, e = select.select([self.masterFd], [], [], timeout)
+        except select.error, (en, msg):
+            if en == errno.EINTR:
+                return True
+            raise
+        if not r:
+            return False
+
+        try:
+            data = os.read(self.masterFd, 65536)
+        except OSError:
+            return False
+        if not data:
+            return False
+
+        self.onNewData(data)
+        return True
+
+    def drain(self):
+        """
+        Called whenever the channel is readable while GDB is busy with
+        something else. GDB writes asynchronous records to every MI channel
+        and would block if nobody read them.
+        """
+        self.lock.acquire()
+        try:
+            while self.readSome(0):
+                pass
+        finally:
+            self.lock.release()
+
+    def onNewData(self, data):
+        lines = (self.partial + data).split('\n')
+        self.partial = lines.pop()
+        for line in lines:
+            self.onNewLine(line.rstrip('\r'))
+
+    def onNewLine(self, line):
+        m = self.resultPat.match(line)
+        if self.recorder and not line.startswith('(gdb)'):
+            if m:
+                self.recorder.record('mi-out', m.group(2))
+            else:
+                self.recorder.record('mi-out', line)
+
+        if line.startswith('(gdb)'):
+            self.promptSeen = True
+            return
+
+        # Console output of a command comes as stream records just before
+        # its result record.
+        if line.startswith('~'):
+            self.consoleParts.append(line[1:])
+            return
+
+        if m:
+            self.results[int(m.group(1))] = (m.group(2), self.consoleParts)
+            self.consoleParts = []
+
+        # Everything else is an asynchronous record which nobody has asked
+        # for.
+
+    def execute(self, cmds, withConsoleOutput=False):
+        """
+        Runs the given MI commands and returns their result records (with
+        the tokens removed) in the same order. All the commands are written
+        to GDB at once. If withConsoleOutput is True, every result record
+        comes paired with the console output of the command.
+        """
+        self.lock.acquire()
+        try:
+            tokens = []
+            lines = []
+            for cmd in cmds:
+                if self.recorder:
+                    self.recorder.record('mi-in', cmd)
+                tokens.append(self.nextToken)
+                lines.append('%d%s\n' % (self.nextToken, cmd))
+                self.nextToken += 1
+
+            os.write(self.masterFd, ''.join(lines))
+
+            for token in tokens:
+                while token not in self.results:
+                    if not self.readSome():
+                        raise IOError('GDB closed the MI channel')
+
+            results = [self.results.pop(token) for token in tokens]
+            if withConsoleOutput:
+                return [(record, ''.join([cUnescape(p) for p in parts]))
+                        for (record, parts) in results]
+            return [record for (record, parts) in results]
+        finally:
+            self.lock.release()
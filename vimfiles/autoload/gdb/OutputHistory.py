@@ -0,0 +1,212 @@
+import os
+import threading
+from collections import deque
+
+class OutputHistory:
+    """
+    Output which piles up till somebody asks for it, such as what GDB says
+    while the program runs in the background or what the program prints.
+
+    Only the last maxPending bytes are kept in memory, so however long
+    nobody asks, we never use more than that. take() hands out what is
+    left and says how much of it was thrown away. Everything is also
+    written to the log file, if there is one, which is moved to
+    <log>.1 once it gets bigger than maxLogSize. readHistory() gives back
+    as much of the output as we still have.
+    """
+    def __init__(self, maxPending=256*1024, logFileName=None,
+                 maxLogSize=64*1024*1024, what='output'):
+        self.lock = threading.Lock()
+        self.chunks = deque()
+        self.numPending = 0
+        self.numElided = 0
+        self.maxPending = maxPending
+        # What to call the output when we say we threw some of it away.
+        self.what = what
+
+        self.logFileName = None
+        self.maxLogSize = maxLogSize
+        self.logFile = None
+        self.logSize = 0
+        if logFileName:
+            self.openLog(logFileName)
+
+    def openLog(self, logFileName):
+        """
+        Starts writing the output to the given file from now on.
+        """
+        self.lock.acquire()
+        try:
+            if self.logFile:
+                self.logFile.close()
+            self.logFileName = logFileName
+            self.logFile = open(logFileName, 'w')
+            self.logSize = 0
+            # Whatever an earlier session left is not our history.
+            if os.path.exists(logFileName + '.1'):
+                os.remove(logFileName + '.1')
+        finally:
+            self.lock.release()
+
+    def append(self, data):
+        self.lock.acquire()
+        try:
+            if self.logFile:
+                self.writeLog(data)
+
+            self.chunks.append(data)
+            self.numPending += len(data)
+            # Drop the oldest chunks, and the oldest part of the last one
+            # we drop, so that we never copy more than one chunk.
+            while self.numPending > self.maxPending:
+                excess = self.numPending - self.maxPending
+                first = self.chunks[0]
+                if len(first) <= excess:
+                    self.chunks.popleft()
+                    excess = len(first)
+                else:
+                    self.chunks[0] = first[excess:]
+                self.numPending -= excess
+                self.numElided += excess
+        finally:
+            self.lock.release()
+
+    def writeLog(self, data):
+        if self.logSize + len(data) > self.maxLogSize:
+            # Keep the previous part around for readHistory().
+            self.logFile.close()
+            os.rename(self.logFileName, self.logFileName + '.1')
+            self.logFile = open(self.logFileName, 'w')
+            self.logSize = 0
+        self.logFile.write(data)
+        self.logFile.flush()
+        self.logSize += len(data)
+
+    def take(self):
+        """
+        Returns the output since the last call, starting with a line
+        which says how much of it we had to throw away, if any.
+        """
+        self.lock.acquire()
+        try:
+            data = ''.join(self.chunks)
+            numElided = self.numElided
+            self.resetPending()
+        finally:
+            self.lock.release()
+
+        if numElided:
+            where = ''
+            if self.logFileName:
+                where = ', see %s' % self.logFileName
+            data = '[%d bytes of %s skipped%s]\n%s' % (numElided, self.what, where, data)
+        return data
+
+    def clear(self):
+        """
+        Forgets the output nobody took. The log keeps it.
+        """
+        self.lock.acquire()
+        try:
+            self.resetPending()
+        finally:
+            self.lock.release()
+
+    def resetPending(self):
+        self.chunks = deque()
+        self.numPending = 0
+        self.numElided = 0
+
+    def savePending(self):
+        """
+        Returns what nobody took yet, for restorePending(), and forgets it.
+        """
+        self.lock.acquire()
+        try:
+            saved = (self.chunks, self.numPending, self.numElided)
+            self.resetPending()
+        finally:
+            self.lock.release()
+        return saved
+
+    def restorePending(self, saved):
+        """
+        Puts back what savePending() returned in place of whatever came
+        since. It is in the log already.
+        """
+        self.lock.acquire()
+        try:
+            (self.chunks, self.numPending, self.numElided) = saved
+        finally:
+            self.lock.release()
+
+    def readHistory(self, chunkSize=65536):
+        """
+        Yields all of the output we still have, oldest first, in pieces of
+        at most chunkSize bytes. That is what is in the log or, without
+        one, what nobody has taken yet.
+        """
+        self.lock.acquire()
+        try:
+            if not self.logFile:
+                pending = ''.join(self.chunks)
+                parts = []
+            else:
+                pending = ''
+                # Open the files while nobody can move them and only read
+                # as far as they went then.
+                parts = []
+                for fileName in (self.logFileName + '.1', self.logFileName):
+                    try:
+                        f = open(fileName)
+                    except IOError:
+                        continue
+                    parts.append((f, os.fstat(f.fileno()).st_size))
+        finally:
+            self.lock.release()
+
+        for i in range(0, len(pending), chunkSize):
+            yield pending[i:i+chunkSize]
+
+        for (f, size) in parts:
+            try:
+                while size > 0:
+                    data = f.read(min(size, chunkSize))
+                    if not data:
+                        break
+                    size -= len(data)
+                    yield data
+            finally:
+                f.close()
+
+    def close(self):
+        if self.logFile:
+            self.logFile.close()
+            self.logFile = None
+
+if __name__ == "__main__":
+    import tempfile
+
+    history = OutputHistory(maxPending=10)
+    for piece in ['abc', 'defgh', 'ijklmnop', 'q']:
+        history.append(piece)
+    data = history.take()
+    print repr(data)
+    assert data == '[7 bytes of output skipped]\nhijklmnopq'
+    assert history.take() == ''
+
+    history.append('abc')
+    saved = history.savePending()
+    history.append('def')
+    history.restorePending(saved)
+    assert history.take() == 'abc'
+
+    logFileName = tempfile.mktemp()
+    history = OutputHistory(maxPending=4, logFileName=logFileName, maxLogSize=8)
+    for piece in ['abcd', 'efgh', 'ijkl']:
+        history.append(piece)
+    print repr(history.take()), repr(''.join(history.readHistory(chunkSize=3)))
+    assert ''.join(history.readHistory()) == 'abcdefghijkl'
+    history.close()
+    os.remove(logFileName)
+    os.remove(logFileName + '.1')
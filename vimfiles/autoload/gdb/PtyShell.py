@@ -0,0 +1,126 @@
+import os
+import pty
+import fcntl
+import errno
+import shlex
+import signal
+import struct
+import termios
+import time
+
+class PtyShell:
+    """
+    Runs a command on a pseudo-terminal. This is all of pexpect we need:
+    the server does its own waiting with select() over our fileno() and
+    every other descriptor it is interested in, and calls read() once it is
+    readable.
+
+    Reads and writes go straight to the terminal. We only ask the kernel
+    about the child when the terminal tells us it has gone away, instead
+    of before every read.
+    """
+    def __init__(self, cmd, rows=24, cols=80):
+        self.args = shlex.split(cmd)
+        self.exitStatus = None
+
+        self.pid, self.child_fd = pty.fork()
+        if self.pid == 0:
+            self.execChild(rows, cols)
+
+        # GDB never changes the interrupt character, so look it up once.
+        self.intrChar = termios.tcgetattr(self.child_fd)[6][termios.VINTR]
+        # Select tells us when there is something to read. Never let a
+        # read block the thread because somebody else got to it first.
+        flags = fcntl.fcntl(self.child_fd, fcntl.F_GETFL)
+        fcntl.fcntl(self.child_fd, fcntl.F_SETFL, flags | os.O_NONBLOCK)
+
+    def execChild(self, rows, cols):
+        try:
+            fcntl.ioctl(1, termios.TIOCSWINSZ, struct.pack('HHHH', rows, cols, 0, 0))
+        except IOError:
+            pass
+        # Do not let the child hold on to our sockets and pipes.
+        os.closerange(3, os.sysconf('SC_OPEN_MAX'))
+        signal.signal(signal.SIGHUP, signal.SIG_IGN)
+        try:
+            os.execvp(self.args[0], self.args)
+        finally:
+            os._exit(127)
+
+    def fileno(self):
+        return self.child_fd
+
+    def read(self, size=65536):
+        """
+        Returns what the child said, '' once it has gone away or None if
+        there is nothing to read right now.
+        """
+        try:
+            data = os.read(self.child_fd, size)
+        except OSError, e:
+            if e.errno in (errno.EAGAIN, errno.EINTR):
+                return None
+            # Linux raises EIO once the child has closed the terminal.
+            data = ''
+        if not data:
+            self.reap()
+        return data
+
+    def send(self, data):
+        while data:
+            try:
+                n = os.write(self.child_fd, data)
+            except OSError, e:
+                if e.errno in (errno.EAGAIN, errno.EINTR):
+                    # The child is not reading its terminal fast enough.
+                    time.sleep(0.001)
+                    continue
+                raise
+            data = data[n:]
+
+    def sendintr(self):
+        self.send(self.intrChar)
+
+    def reap(self, options=os.WNOHANG):
+        """
+        Collects the exit status of the child. Returns False if it is still
+        running.
+        """
+        if self.exitStatus is not None:
+            return True
+        try:
+            pid, status = os.waitpid(self.pid, options)
+        except OSError, e:
+            if e.errno != errno.ECHILD:
+                raise
+            # Somebody else waited for it.
+            pid, status = self.pid, 0
+        if pid == 0:
+            return False
+        self.exitStatus = status
+        return True
+
+    def isalive(self):
+        return not self.reap()
+
+    def terminate(self, timeout=0.1):
+        """
+        Asks the child to go away, nicely at first, and closes the
+        terminal.
+        """
+        for sig in (signal.SIGHUP, signal.SIGCONT, signal.SIGINT, signal.SIGKILL):
+            if self.reap():
+                break
+            try:
+                os.kill(self.pid, sig)
+            except OSError:
+                pass
+            endTime = time.time() + timeout
+            while not self.reap() and time.time() < endTime:
+                time.sleep(0.005)
+        self.close()
+
+    def close(self):
+        if self.child_fd != -1:
+            os.close(self.child_fd)
+            self.child_fd = -1
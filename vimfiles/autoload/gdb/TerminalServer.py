@@ -1,13 +1,23 @@
 from threading import Thread, Timer
+import Queue
+import itertools
 import socket
-import os, sys
+import select
+import errno
+import os
+import fcntl
 import re
 from sockutils import *
-import mypexpect
+from PtyShell import PtyShell
+from OutputHistory import OutputHistory
 
 import logging
 
 class ReaderThread(Thread):
+    """
+    Runs a command which can take a long time in the background. A cmd of
+    None reads what the shell says when it starts up instead.
+    """
     def __init__(self, server, cmd):
         Thread.__init__(self)
         self.server = server
@@ -22,61 +32,129 @@ class ReaderThread(Thread):
 
     def run_try(self):
         self.server.resumeOnReaderDone = True
-        self.server.getReply(self.cmd)
+        if self.cmd is None:
+            self.server.readStartupOutput()
+        else:
+            self.server.getReply(self.cmd)
         self.server.onReaderAboutToBeDone()
 
+class ConnectionThread(Thread):
+    """
+    Reads the requests of one client.
+    """
+    def __init__(self, server, conn):
+        Thread.__init__(self)
+        self.setDaemon(True)
+        self.server = server
+        self.conn = conn
+
+    def run(self):
+        try:
+            self.server.serveConnection(self.conn)
+        except:
+            self.server.exception('Exception in connection thread')
+
 class TerminalServer:
-    def __init__(self, cmd='gdb'):
+    """
+    Runs a shell on a pseudo-terminal and lets clients talk to it over
+    sockets.
+
+    Every client connection gets a thread of its own which reads its
+    requests. Requests which only need to look at our own state, such as
+    asking whether we are busy, interrupting the shell or flushing its
+    output, are answered right away by that thread. Requests which need
+    the shell are queued and run one at a time by the thread which called
+    run(). So a client can still interrupt a command which takes forever.
+
+    Queued requests run most urgent first, see parseMode(). That only
+    changes anything for clients which send several requests without
+    waiting for the replies, or for several clients at once. A client
+    which waits for every reply, as VimGdbClient does, gets them in the
+    order it asked anyway. A request can also say which stop of the
+    program it is about. Every time the program is resumed, requests
+    about earlier stops are dropped without bothering the shell with them.
+    """
+
+    # How urgent a request is. Requests of the same priority run in the
+    # order they arrive.
+    priorities = {'interactive': 0, 'normal': 1, 'refresh': 2}
+    def __init__(self, cmd='gdb', recorder=None, useTcp=False, outputLog=None):
         self.reader = None
         self.socket = None
-        self.conn = None
+        self.connections = []
+        # The client which gets our events. See pushEvent().
+        self.subscriber = None
+        # The client and tag of the request which is running right now,
+        # if it wants the output as it arrives.
+        self.replyConn = None
+        self.replyTag = None
+        self.dieConn = None
+        self.dieTag = None
+        self.dying = False
+        # Requests waiting for the shell. See runRequests().
+        self.requests = Queue.PriorityQueue()
+        self.requestCounter = itertools.count()
+        self.requestInProgress = False
+        # Goes up every time the program is resumed.
+        self.generation = 0
+        # Answers to the questions the shell asks. See readAnswer().
+        self.answers = Queue.Queue()
         self.stopReading = False
-        self.newDataTotal = ''
-        self.newDataForClient = ''
+        # Output is kept as lists of chunks which are only joined when
+        # somebody asks for them. Growing a string a packet at a time
+        # takes quadratic time for commands with huge outputs.
+        self.newDataChunks = []
+        # What the shell says while nobody is waiting for a reply, till a
+        # client flushes it. A program can run for hours, so only the
+        # latest part of it is kept in memory. The rest goes to outputLog
+        # if we have one. See the HISTORY request.
+        self.outputForClient = OutputHistory(logFileName=outputLog)
         self.resumeOnReaderDone = True
+        # Becomes True once the shell shows its first prompt.
+        self.ready = False
         self.shell = None
         self.cmd = cmd
+        # Writes down everything we say to the shell and everything it
+        # says back. See GdbReplay.py.
+        self.recorder = recorder
+
+        # Writing to this pipe wakes up the reader when it is blocked
+        # waiting for GDB to say something.
+        self.wakeupPipe = os.pipe()
+        fcntl.fcntl(self.wakeupPipe[1], fcntl.F_SETFL, os.O_NONBLOCK)
+        # How much output we let pile up for a client which is slow to
+        # read it before we stop reading from GDB. See readToPrompt().
+        self.maxQueuedOutput = 4*1024*1024
 
         self.logger = logging.getLogger(self.getLoggerName())
 
         self.debug('Starting server....')
 
-        # Bind to port.
-        self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-
-        # The magic line below prevents the socket from throwing the
-        # "socket already in use" address which results in a timeout of
-        # about 30 seconds between successive invocations of this program.
-        self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-
-        # Use 0 to let the OS give us an unused port number. Otherwise, we
-        # cannot have two simultaneous debugging sessions on the same
-        # machine!
-        self.socket.bind(('127.0.0.1', 0))
-
-        # Start GDB shell.
-        self.shell = mypexpect.spawn(self.cmd)
+        # A Unix domain socket unless asked otherwise. See sockutils.py
+        self.socket = makeListeningSocket(useTcp)
+        # The socket is closed while clients can still ask for this.
+        self.address = getSocketAddress(self.socket)
 
-        # read initial declaration from GDB.
-        self.readToPrompt()
+        # Start GDB shell. What it says till its first prompt is read in
+        # the background once we start serving. See run_try().
+        self.shell = PtyShell(self.cmd)
 
     def debug(self, msg):
         self.logger.debug(msg)
 
+    def getAddress(self):
+        """
+        Returns what to give GdbClient to connect to us.
+        """
+        return self.address
+
     def exception(self, msg):
         self.logger.exception(msg)
 
-    def closeConnection(self, reason):
-        self.debug('closing connection, reason = "%s", conn = %s' % (reason, self.conn))
-        if self.conn:
-            sendData(self.conn, reason+'\n')
-            sendData(self.conn, '--GDB--EXIT--\n')
-
-            # print 'Server shutting down connection'
-            self.conn.shutdown(2)
-            self.conn.close()
-            del self.conn
-            self.conn = None
+    def endReply(self, conn, tag, reason):
+        self.debug('ending reply to %s, reason = "%s"' % (tag, reason))
+        if conn:
+            conn.sendMsg(tag, 'END', reason)
 
     def run(self):
         try:
@@ -86,84 +164,315 @@ class TerminalServer:
             raise
 
     def run_try(self):
-        # Now wait for someone to ask us to do something...
-        while 1:
+        # GDB can take a long while to load the symbols of a large program
+        # before it shows its first prompt. Meanwhile we are busy just as
+        # if the program were running: the client can get at the output so
+        # far and is told when we are ready.
+        self.reader = ReaderThread(self, None)
+        self.reader.start()
+
+        self.socket.listen(5)
+        acceptor = Thread(target=self.acceptConnections)
+        acceptor.setDaemon(True)
+        acceptor.start()
+
+        self.runRequests()
+
+        self.debug('Done with main server loop...')
+
+        # Done main server loop... Do cleanup...
+        self.dying = True
+        try:
+            # Wakes up the acceptor.
+            self.socket.shutdown(socket.SHUT_RDWR)
+        except socket.error:
+            pass
+        closeListeningSocket(self.socket)
+
+        if self.reader and self.reader.isAlive():
+            # print 'Closing child reader threads...'
+            self.resumeOnReaderDone = False
+            self.stopReading = True
+            self.wakeUpReader()
+            self.reader.join()
+            self.reader = None
+            self.stopReading = False
+
+        self.shell.terminate()
+        self.onShutdown()
+        self.outputForClient.close()
+        self.endReply(self.dieConn, self.dieTag, 'BYE')
+        for conn in self.connections[:]:
+            conn.close()
+        self.connections = []
+
+    def acceptConnections(self):
+        # A client usually keeps its connection open for the whole session
+        # and sends all its requests over it, but anybody else can come
+        # along and ask us something at the same time.
+        while not self.dying:
             try:
-                self.socket.listen(1)
-                self.conn, addr = self.socket.accept()
+                sock, addr = self.socket.accept()
             except:
+                if self.dying:
+                    break
                 self.exception('Socket listening threw an exception!')
                 continue
 
+            conn = MsgConnection(sock)
+            # Never let a client which is slow to read hold up whoever
+            # is sending to it, most of all the thread reading from GDB.
+            conn.startSender(self.maxQueuedOutput, self.wakeUpReader)
+            self.connections.append(conn)
+            ConnectionThread(self, conn).start()
+
+    def serveConnection(self, conn):
+        """
+        Handles requests from the given client till it disconnects.
+        """
+        while 1:
             try:
-                data = self.conn.recv(1024)
+                msg = conn.readMsg()
             except:
-                self.exception('Socket accept threw an exception')
+                if not self.dying:
+                    self.exception('Socket read threw an exception')
                 break
 
-            tokens = data.split(' ', 1)
-            mode = tokens[0]
-            command = ''.join(tokens[1:])
-            self.debug('getting mode = [%s], command [%s]' % (mode, command))
+            if msg is None:
+                self.debug('Client closed the connection')
+                break
 
-            if not re.match('INT|SYNC|ASYNC|ISBUSY|DIE|FLUSH', mode):
-                if not self.isValidMode(mode):
-                    self.closeConnection('WRONG_MODE')
-                    continue
+            tag, mode, command = msg
+            try:
+                self.handleRequest(conn, tag, mode, command)
+            except:
+                self.exception('Exception in handling request %s' % mode)
+                break
 
-            # let overloaded classes have a go at figuring out how to
-            # handle the command.
-            if self.handleCmd(mode, command):
+        if conn in self.connections:
+            self.connections.remove(conn)
+        if conn is self.subscriber:
+            self.subscriber = None
+            # Do not leave anyone waiting for an answer from a client
+            # which is gone.
+            self.answers.put(None)
+        conn.close()
+
+    def parseMode(self, mode):
+        """
+        Splits the mode of a request of the form
+
+            MODE[:priority[:generation]]
+
+        into its parts. priority is one of the keys of self.priorities and
+        generation is the stop of the program the request is about, as
+        given by the RESUME event. Returns (mode, priority, generation),
+        with a generation of None for requests which are never stale.
+        """
+        parts = mode.split(':')
+        priority = self.priorities['normal']
+        generation = None
+        if len(parts) > 1 and parts[1] in self.priorities:
+            priority = self.priorities[parts[1]]
+        if len(parts) > 2 and parts[2].isdigit():
+            generation = int(parts[2])
+        return parts[0], priority, generation
+
+    def handleRequest(self, conn, tag, mode, command):
+        self.debug('getting tag = %d, mode = [%s], command [%s]' % (tag, mode, command))
+        mode, priority, generation = self.parseMode(mode)
+
+        # The answer to a question the shell asked. This is not a
+        # request, so there is nothing to reply to.
+        if mode == 'ANS':
+            self.answers.put(command)
+            return
+
+        if mode == 'SUBSCRIBE':
+            self.subscriber = conn
+            self.endReply(conn, tag, '')
+            # The client might have missed us getting ready.
+            if self.ready:
+                self.onReady()
+            return
+
+        if mode == 'UNSUBSCRIBE':
+            if self.subscriber is conn:
+                self.subscriber = None
+            self.endReply(conn, tag, '')
+            return
+
+        if not re.match('INT|SYNC|ASYNC|ISBUSY|DIE|FLUSH|HISTORY', mode):
+            if not self.isValidMode(mode):
+                self.endReply(conn, tag, 'WRONG_MODE')
+                return
+
+        # Requests we can answer right away, even while the shell is
+        # running a command.
+        if mode == 'ISBUSY':
+            if self.isBusy() or self.requestInProgress:
+                self.endReply(conn, tag, 'BUSY')
+            else:
+                self.endReply(conn, tag, '')
+            return
+
+        if mode == 'INT':
+            # Need to end the reply first so that the client doesn't see
+            # GDB output in weird out of order way.
+            self.endReply(conn, tag, '')
+            if self.isBusy():
+                self.interrupt()
+            elif self.requestInProgress:
+                self.shell.sendintr()
+            return
+
+        if 'FLUSH' in mode:
+            self.flush(conn, tag)
+            self.endReply(conn, tag, '')
+            return
+
+        if mode == 'HISTORY':
+            # Everything the shell said while nobody was waiting for a
+            # reply, as far as we still have it, flushed or not.
+            for data in self.outputForClient.readHistory():
+                conn.sendMsg(tag, 'DATA', data)
+            self.endReply(conn, tag, '')
+            return
+
+        # let overloaded classes have a go at answering the request.
+        if self.handleControlCmd(conn, tag, mode, command):
+            return
+
+        # Everything else needs the shell.
+        self.requests.put((priority, self.requestCounter.next(),
+                           (conn, tag, mode, command, generation)))
+
+    def isStale(self, generation):
+        return generation is not None and generation < self.generation
+
+    def runRequests(self):
+        """
+        Runs the requests which need the shell one at a time, most urgent
+        first, till a client asks us to go away.
+        """
+        while 1:
+            priority, n, request = self.requests.get()
+            conn, tag, mode, command, generation = request
+
+            if self.isStale(generation):
+                self.endReply(conn, tag, 'STALE')
                 continue
 
             # client wants us to go away...
             if mode == 'DIE':
                 self.debug('Client wants us to go away...')
-                break
+                self.dieConn = conn
+                self.dieTag = tag
+                return
 
-            if ('SYNC' in mode) and (command == ''):
-                self.closeConnection('WRONG_FORMAT')
-                continue
-
-            if 'FLUSH' in mode:
-                self.flush()
-                self.closeConnection('')
-                continue
-
-            isBusy = self.reader and self.reader.isAlive() 
-            if mode == 'INT':
-                if isBusy:
-                    # Need to close the connection first so that the client
-                    # doesn't see GDB output in weird out of order way.
-                    self.closeConnection('')
-                    self.interrupt()
-            elif isBusy:
-                self.closeConnection('BUSY')
-            elif mode == 'SYNC':
+            self.requestInProgress = True
+            try:
+                self.runRequest(conn, tag, mode, command)
+            except Exception, e:
+                self.exception('Exception in running request %s' % mode)
+                self.replyConn = None
+                self.replyTag = None
+                # The client is waiting for the reply. Tell it what went
+                # wrong instead of leaving it waiting forever.
+                try:
+                    self.endReply(conn, tag, 'ERROR %s' % e)
+                except:
+                    self.exception('Could not tell the client about it')
+            self.requestInProgress = False
+
+    def dropStaleRequests(self):
+        """
+        Ends the queued requests about stops of the program which are
+        over, so that their clients need not wait for them.
+        """
+        keep = []
+        while 1:
+            try:
+                item = self.requests.get_nowait()
+            except Queue.Empty:
+                break
+            conn, tag, mode, command, generation = item[2]
+            if self.isStale(generation):
+                self.endReply(conn, tag, 'STALE')
+            else:
+                keep.append(item)
+        for item in keep:
+            self.requests.put(item)
+
+    def runRequest(self, conn, tag, mode, command):
+        # let overloaded classes have a go at figuring out how to
+        # handle the command. If they do, they also take care of replying.
+        if self.handleCmd(conn, tag, mode, command):
+            return
+
+        if ('SYNC' in mode) and (command == ''):
+            self.endReply(conn, tag, 'WRONG_FORMAT')
+            return
+
+        if self.isBusy():
+            self.endReply(conn, tag, 'BUSY')
+        elif mode == 'SYNC':
+            self.replyConn = conn
+            self.replyTag = tag
+            try:
                 self.getReply(command)
-            elif mode == 'ASYNC':
-                # important to close the connection before we star the
-                # reader thread otherwise the reader thread can try to send
-                # data over an invalid connection.
-                self.closeConnection('')
-                self.reader = ReaderThread(self, command)
-                self.reader.start()
+            finally:
+                self.replyConn = None
+                self.replyTag = None
+            self.endReply(conn, tag, '')
+        elif mode == 'ASYNC':
+            # The program is off again, so whatever was queued about where
+            # it stopped last is of no use anymore.
+            self.generation += 1
+            self.dropStaleRequests()
+
+            # important to end the reply before we start the reader
+            # thread. Whatever the reader thread reads is kept for the
+            # client till it asks us to flush it.
+            self.endReply(conn, tag, '')
+            self.reader = ReaderThread(self, command)
+            self.reader.start()
+        else:
+            self.endReply(conn, tag, '')
 
-            self.closeConnection('')
+    def isBusy(self):
+        return self.reader and self.reader.isAlive()
 
-        self.debug('Done with main server loop...')
+    def pushEvent(self, kind, payload=''):
+        """
+        Sends an unsolicited message to the client if it asked for them by
+        subscribing. Events always carry the tag 0. Returns False if there
+        is nobody to tell.
+        """
+        conn = self.subscriber
+        if not conn:
+            return False
 
-        # Done main server loop... Do cleanup...
-        if self.reader and self.reader.isAlive():
-            # print 'Closing child reader threads...'
-            self.resumeOnReaderDone = False
-            self.stopReading = True
-            self.reader.join()
-            self.reader = None
-            self.stopReading = False
+        self.debug('pushing event %s [%s]' % (kind, payload))
+        try:
+            conn.sendMsg(0, kind, payload)
+        except:
+            self.exception('Could not push event to the client')
+            return False
+        return True
 
-        self.shell.terminate()
-        self.closeConnection('BYE')
+    def askSubscriber(self, kind, payload):
+        """
+        Pushes an event to the client and waits for it to send back an
+        answer. Returns None if there is no subscribed client.
+        """
+        # Throw away whatever was left over from earlier questions.
+        while not self.answers.empty():
+            self.answers.get()
+
+        if not self.pushEvent(kind, payload):
+            return None
+        return self.answers.get()
 
     def interrupt(self):
         """
@@ -183,25 +492,29 @@ class TerminalServer:
         if self.reader:
             self.reader.join()
             self.reader = None
+        # GDB gives up loading symbols when interrupted and shows the
+        # prompt.
+        if not self.ready:
+            self.ready = True
+            self.onReady()
 
-    def flush(self): 
-        sendData(self.conn, self.newDataForClient)
-        self.newDataForClient = ''
+    def flush(self, conn, tag):
+        conn.sendMsg(tag, 'DATA', self.outputForClient.take())
 
     def onNewData(self, data):
         self.debug('data = %s' % repr(data))
-        if self.conn:
-            sendData(self.conn, data)
+        if self.replyTag is not None:
+            self.replyConn.queueMsg(self.replyTag, 'DATA', data)
         else:
-            self.newDataForClient += data
+            self.outputForClient.append(data)
 
-        if self.needsUserInput(self.newDataTotal):
-            if self.conn:
-                # If connection is alive, we assume that the client is
-                # going to give us the answer.
-                reply = self.conn.recv(1024)
+        if self.needsUserInput():
+            if self.replyTag is not None:
+                # If a client is waiting for this reply, we assume that
+                # it is going to give us the answer.
+                reply = self.readAnswer()
             else:
-                reply = self.getUserInput(self.newDataTotal)
+                reply = self.getUserInput()
             self.write(reply.strip() + '\n')
 
     def onReaderAboutToBeDone(self):
@@ -227,56 +540,140 @@ class TerminalServer:
     def waitForReader(self):
         self.reader.join()
         self.reader = None
-        self.onResume()
+        if self.ready:
+            self.onResume()
+        else:
+            self.ready = True
+            self.onReady()
+
+    def wakeUpReader(self):
+        try:
+            os.write(self.wakeupPipe[1], 'x')
+        except OSError, e:
+            # The pipe is full, so the reader has plenty of wakeups to
+            # get through already.
+            if e.errno != errno.EAGAIN:
+                raise
+
+    def isOutputBlocked(self):
+        conn = self.replyConn
+        return conn is not None and conn.isFull()
+
+    def readAnswer(self):
+        # The thread reading the requests of the client hands us the
+        # answer.
+        answer = self.answers.get()
+        if answer is None:
+            return ''
+        return answer
 
     def write(self, cmd):
+        if self.recorder:
+            self.recorder.record('in', cmd)
         self.shell.send(cmd)
 
     def readToPrompt(self):
-        self.newDataForClient = ''
-        self.newDataTotal = ''
-
+        self.outputForClient.clear()
+        self.newDataChunks = []
+        self.resetOutputState()
+
+        # Block till either GDB says something or someone wants us to stop
+        # reading. Whatever GDB says is handed over to feedOutput() as it
+        # arrives so that we never need to look at the whole reply again.
+        childFd = self.shell.fileno()
+        wakeupFd = self.wakeupPipe[0]
+        readFds = [childFd, wakeupFd] + self.getExtraReadFds()
         while not self.stopReading:
+            # While the client we are sending the output to has too much
+            # of it to read already, leave GDB waiting till it catches up.
+            # We are woken up when it does.
+            fds = readFds
+            if self.isOutputBlocked():
+                fds = readFds[1:]
             try:
-                data = self.shell.read_nonblocking(size=4096, timeout=0.2)
-                self.newDataTotal += data
-            except mypexpect.TIMEOUT:
+                r, w, e = select.select(fds, [], [])
+            except select.error, (en, msg):
+                if en == errno.EINTR:
+                    continue
+                raise
+
+            if wakeupFd in r:
+                os.read(wakeupFd, 1024)
+                continue
+
+            for fd in r:
+                if fd != childFd:
+                    self.onExtraFdReadable(fd)
+            if childFd not in r:
                 continue
-            except mypexpect.EOF:
-                return self.newDataTotal
+
+            data = self.shell.read()
+            if data is None:
+                continue
+            if not data:
+                break
+
+            if self.recorder:
+                self.recorder.record('out', data)
+            self.newDataChunks.append(data)
+            self.feedOutput(data)
 
             self.onNewData(data)
 
-            if self.hasPromptArrived(self.newDataTotal):
-                return self.newDataTotal
+            if self.hasPromptArrived():
+                break
 
-        return self.newDataTotal
+        return ''.join(self.newDataChunks)
 
     def getReply(self, cmd):
-        self.newDataTotal = ''
+        self.newDataChunks = []
         self.write(cmd + '\n')
         return self.readToPrompt()
 
+    def readStartupOutput(self):
+        return self.readToPrompt()
+
     # Methods which need to be over-written
     def isValidMode(self, mode):
         return False
 
-    def handleCmd(self, mode, cmd):
+    def handleCmd(self, conn, tag, mode, cmd):
+        pass
+
+    def handleControlCmd(self, conn, tag, mode, cmd):
+        pass
+
+    def getExtraReadFds(self):
+        return []
+
+    def onExtraFdReadable(self, fd):
         pass
 
     def getLoggerName(self):
         return ''
 
-    def hasPromptArrived(self, data):
+    def resetOutputState(self):
+        pass
+
+    def feedOutput(self, data):
+        pass
+
+    def hasPromptArrived(self):
         return False
 
-    def needsUserInput(self, data):
+    def needsUserInput(self):
         return False
 
-    def getUserInput(self, data):
+    def getUserInput(self):
         return ''
 
     def onResume(self):
         pass
 
+    def onReady(self):
+        pass
+
+    def onShutdown(self):
+        pass
+
 
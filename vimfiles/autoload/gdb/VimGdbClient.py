@@ -1,13 +1,11 @@
-import socket
-import sys
 import vim
 import re
-import errno
-from sockutils import *
-from GdbMiParser import parseGdbMi
-import cStringIO
+from GdbClient import GdbClient
+from GdbMiParser import parseGdbMi, MiVarObj, cEscape
+from LineSplitter import LineSplitter
 import time
 import os
+from collections import OrderedDict
 
 import logging
 
@@ -25,119 +23,99 @@ def initLogging(logVerbose):
     except:
         pass
 
-class VimGdbClient:
-    def __init__(self, portNum):
+class VimGdbClient(GdbClient):
+    def __init__(self, address):
+        GdbClient.__init__(self, address)
         self.queryPat = re.compile(r'pre-query\r\n(?P<query>.*)\r\nquery', re.DOTALL)
         self.preCommandsPat = re.compile(r'pre-commands\r\n(?P<query>.*)\r\ncommands\r\n', re.DOTALL)
-        self.newDataTotal = ''
+        self.resetNewData()
         self.updateWindow = True
-        self.toprint = ''
-        self.socket = None
+        self.lineSplitter = LineSplitter()
         self.queryAnswer = None
         self.isFlushing = False
-        self.portNum = portNum
+        # Lines waiting to be shown in the command window. We update it at
+        # most once every cmdWinUpdateInterval seconds while output streams
+        # in and once more when the reply is done.
         self.newLines = []
-
-        self.logger = logging.getLogger('VimGdb.client')
-
-    def debug(self, msg):
-        if self.logger:
-            self.logger.debug(msg)
-
-    def exception(self, msg):
-        if self.logger:
-            self.logger.exception(msg)
-
-    def getReply(self, input):
-        try:
-            return self.getReply_try(input)
-        except:
-            self.exception('Exception in getting reply!')
-            # raise
-    
-    def tryConnect(self):
-        HOST = '127.0.0.1'        # The remote host
-        PORT = self.portNum       # The same port as used by the server
-        self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-
-        numAttempts = 0
-        while numAttempts < 3:
-            try:
-                self.socket.connect((HOST, PORT))
-                return
-            except socket.error, (en, msg):
-                self.debug('Getting connection error %s (%s)' % (en, msg))
-
-            time.sleep(0.1)
-            numAttempts += 1
-
-
-    def getReply_try(self, input):
-        self.tryConnect()
-
-        # If there's an empty packet, we keep trying 3 times after the
-        # first empty packet just to ensure that the server is _really_
-        # done sending everything it wants to.
-        maxEmptyPackets = 3
-        nEmptyPackets = 0
-
-        self.debug('Sending message [%s]' % input)
-        sendData(self.socket, input)
-        self.stopReading = False
-        while not self.stopReading:
-            try:
-                data = self.socket.recv(1024)
-                if not data:
-                    self.debug('Timing out before receiving end marker')
-                    nEmptyPackets = nEmptyPackets + 1
-                    if nEmptyPackets > maxEmptyPackets:
-                        self.debug('Too many empty packets recd. Breaking out of loop...')
-                        break
-                    else:
-                        # Try again after lazing around for a bit.
-                        time.sleep(0.1)
-                        continue
-                else:
-                    nEmptyPackets = 0
-            except socket.error,(en, msg):
-                if en == errno.EINTR:
-                    continue
-                else:
-                    # Since we are trying to repeatedly ask for more data
-                    # even after the socket might be closed by the server,
-                    # we need to account for unforseen errors.
-                    self.exception('Socket error reading from the server... breaking out of read loop')
-                    break
-
-            self.onNewData(data)
-
-        self.debug('Done getting reply from server... Closing socket')
-        self.socket.shutdown(2)
-        self.socket.close()
-        del self.socket
-        self.socket = None
+        self.cmdWinUpdateInterval = 0.05
+        self.lastCmdWinUpdate = 0
+        # Assume the server has a native MI channel till it tells us
+        # otherwise.
+        self.hasMiChannel = True
+        # The variables window index. See getVarLineIndex().
+        self.varLineIndex = {}
+        self.varIndexTick = None
+        self.markedVars = []
+        # What we learnt about the program when it last stopped. See
+        # fetchStopSnapshot().
+        self.snapshot = {}
+        # Which stop of the program we last heard about. See
+        # TerminalServer.parseMode().
+        self.generation = None
+        # Set if the program was resumed before we got the snapshot.
+        self.snapshotStale = False
+        # Values shown in balloons, keyed by frame and expression, least
+        # recently used first.
+        self.balloonCache = OrderedDict()
+        self.balloonCacheSize = 256
+        self.currentFrame = None
+        # If set, GDB does not load the symbols of shared libraries by
+        # itself and we only load the ones which show up on the stack.
+        self.lazySharedLibs = False
+        self.loadedSharedLibs = set()
+        # For the whole session, whatever the program loaded.
+        self.numSharedLibsLoaded = 0
+        self.sharedLibLoadTime = 0.0
+        # What the program printed on its own terminal, at most
+        # programOutputLines of it. See fetchProgramOutput().
+        self.programOutput = []
+        self.programOutputLines = 10000
+        self.programLineSplitter = LineSplitter()
+        # Lines not yet shown in the program output window.
+        self.newProgramLines = []
+
+    # Commands after which the program has a fresh set of shared
+    # libraries.
+    restartPat = re.compile(r'(r|ru|run|start|attach)(\s|$)')
+
+    def runUserCommand(self, cmd):
+        # A command the user typed can change anything, including values
+        # we have cached. The ones we run ourselves only look.
+        self.clearBalloonCache()
+        return self.runCommand(cmd)
 
     def runCommand(self, cmd):
-        self.newDataTotal = ''
+        if self.restartPat.match(cmd):
+            self.loadedSharedLibs = set()
+        self.resetNewData()
         self.debug('+runCommand: %s' % cmd)
         self.getReply('SYNC ' + cmd)
-        self.debug('-runCommand: reply = %s' % self.newDataTotal)
-        return self.newDataTotal
+        out = self.getNewData()
+        self.debug('-runCommand: reply = %s' % out)
+        return out
 
     def resumeProgram(self, cmd):
-        self.newDataTotal = ''
+        self.dropStopSnapshot()
+        self.clearBalloonCache()
+        if self.restartPat.match(cmd):
+            self.loadedSharedLibs = set()
+        self.resetNewData()
         self.debug('+resumeProgram: %s' % cmd)
         self.getReply('ASYNC ' + cmd)
-        self.debug('-resumeProgram: [%s]' % self.newDataTotal)
-        return self.newDataTotal
+        out = self.getNewData()
+        self.debug('-resumeProgram: [%s]' % out)
+        return out
 
     def interrupt(self):
-        self.newDataTotal = ''
+        self.resetNewData()
         self.getReply('INT')
-        return self.newDataTotal
+        return self.getNewData()
 
     def getCommandOutput(self, cmd, var):
-        output = self.runCommand(cmd)
+        if cmd.strip() in self.snapshot:
+            output = self.snapshot.pop(cmd.strip())[1]
+        else:
+            output = self.runCommand(cmd)
         output = re.sub('"', '\\"', output)
         vim.command('let %s = "%s"' % (var, output))
 
@@ -154,70 +132,111 @@ class VimGdbClient:
         vim.command(r'let retval = "%s\n"' % retval)
         return retval
 
+    def onEvent(self, kind, payload):
+        if kind == 'RESUME':
+            if payload:
+                self.generation = int(payload)
+            vim.command('call gdb#gdb#OnResume()')
+        elif kind == 'READY':
+            # We can hear about it twice if we subscribed just as GDB got
+            # ready.
+            if not self.ready:
+                self.ready = True
+                vim.command('call gdb#gdb#OnReady()')
+        elif kind == 'QUERY':
+            answer = self.getQueryAnswer(payload)
+            self.sendAnswer(0, answer)
+        elif kind == 'PROGOUT':
+            self.fetchProgramOutput()
+            vim.command('call gdb#gdb#OnProgramOutput()')
+
     def getCommands(self, query=''):
         ans = vim.eval('input("%s")' % query)
         return ans
 
+    # How much of the latest output we look at for queries. A query is
+    # always the last thing GDB says before it waits for us.
+    tailWindowSize = 8192
+
+    def resetNewData(self):
+        self.newDataChunks = []
+        self.newDataTail = ''
+
+    def getNewData(self):
+        if len(self.newDataChunks) > 1:
+            self.newDataChunks = [''.join(self.newDataChunks)]
+        return ''.join(self.newDataChunks)
+
+    def stripFromNewData(self, pat):
+        self.newDataChunks = [re.sub(pat, '', self.getNewData())]
+        self.newDataTail = re.sub(pat, '', self.newDataTail)
+
     def onNewData(self, data):
         self.debug('onNewData: data: %s' % repr(data))
-        self.newDataTotal += data
+        self.newDataChunks.append(data)
+        self.newDataTail = (self.newDataTail + data)[-self.tailWindowSize:]
 
         if self.updateWindow:
             self.printNewData(data)
 
-        if (not self.isFlushing) and self.socket:
-            m = self.queryPat.search(self.newDataTotal)
+        if (not self.isFlushing) and self.inConversation:
+            m = self.queryPat.search(self.newDataTail)
             if m:
                 query = m.group('query')
                 reply = self.getQueryAnswer(query)
-                self.newDataTotal = re.sub(self.queryPat, '', self.newDataTotal)
-                sendData(self.socket, reply)
-            m = self.preCommandsPat.search(self.newDataTotal)
+                self.stripFromNewData(self.queryPat)
+                self.sendAnswer(self.currentTag, reply)
+            m = self.preCommandsPat.search(self.newDataTail)
             if m:
                 reply = self.getCommands(m.group('query'))
-                self.newDataTotal = re.sub(self.preCommandsPat, '', self.newDataTotal)
-                sendData(self.socket, reply)
-
-        if self.newDataTotal.endswith('--GDB--EXIT--\n'):
-            self.stopReading = True
+                self.stripFromNewData(self.preCommandsPat)
+                self.sendAnswer(self.currentTag, reply)
 
     def printNewData(self, data):
-        def isLinePrintable(line):
-            if not line:
-                return False
-
-            if (line.startswith('') or line.startswith('--GDB--EXIT--')):
-                return False
-
-            return True
-
-        self.toprint += data
-
-        lines = self.toprint.splitlines()
-
-        # If the last line doesn't end with '\n', we cannot assume that it
-        # is full, it might only be partially transmitted.
-        if self.toprint.endswith('\n'):
-            fullLines = lines
-            rest = ''
-        else:
-            fullLines = lines[:-1]
-            rest = lines[-1]
-
-        self.newLines = [line for line in fullLines if isLinePrintable(line)]
-        self.toprint = rest
-
+        for line in self.lineSplitter.feed(data):
+            if line and not line.startswith('\x1a\x1a'):
+                self.newLines.append(line)
+
+        if self.newLines and \
+                time.time() - self.lastCmdWinUpdate >= self.cmdWinUpdateInterval:
+            self.updateCmdWin()
+
+    def onRequestError(self, status):
+        self.debug('request failed: %s' % status)
+        msg = status.replace('\\', '\\\\').replace('"', '\\"')
+        vim.command('echohl ErrorMsg | echomsg "GDB server: %s" | echohl None' % msg)
+
+    def updateCmdWin(self):
+        self.lastCmdWinUpdate = time.time()
+        vim.command('call gdb#gdb#UpdateCmdWin()')
+
+    def readReply(self, tag):
+        status = GdbClient.readReply(self, tag)
+        # Show whatever is left over from the last update.
         if self.newLines:
-            vim.command('call gdb#gdb#UpdateCmdWin()')
-            
+            self.updateCmdWin()
+        return status
+
     def printNewLines(self):
         if self.newLines:
             vim.current.buffer.append(self.newLines)
             self.newLines = []
 
     def getSilentMiOutput(self, cmd):
+        if cmd in self.snapshot:
+            return self.snapshot.pop(cmd)[0]
+
         self.updateWindow = False
-        out = self.runCommand('interpreter mi "%s"' % cmd)
+        out = ''
+        if self.hasMiChannel:
+            self.resetNewData()
+            self.getReply('MI %s' % cmd)
+            out = self.getNewData()
+            if self.replyStatus == 'NOMI':
+                self.hasMiChannel = False
+
+        if not self.hasMiChannel:
+            out = self.runCommand('interpreter mi "%s"' % cmd)
         self.updateWindow = True
 
         # Get the first line after >>post-prompt which starts with \^
@@ -229,38 +248,181 @@ class VimGdbClient:
 
         return ''
 
-    def getParsedGdbMiOutput(self, cmd):
-        return parseGdbMi(self.getSilentMiOutput(cmd))
+    def getParsedGdbMiOutput(self, cmd, recordType=None):
+        # We look at every element of the lists we ask for, which are
+        # small, so they are decoded right away. See MiLazyList.
+        return parseGdbMi(self.getSilentMiOutput(cmd), typed=True,
+                          recordType=recordType)
 
     def isBusy(self):
-        if self.socket:
+        if self.inConversation:
             # This function can sometimes get called when we are actually
             # already in the middle of a conversation with the server. This
             # mostly happens when the balloonexpr is being evaluated.
             return 1
 
+        if self.snapshot:
+            # We just asked about the stopped program and nobody has
+            # resumed it since.
+            return 0
+
         self.updateWindow = False
-        self.newDataTotal = ''
+        self.resetNewData()
         self.getReply('ISBUSY')
         self.updateWindow = True
-        if 'BUSY' in self.newDataTotal:
+        if self.replyStatus == 'BUSY':
             return 1
         else:
             return 0
 
     def terminate(self):
         self.getReply('DIE')
+        self.disconnect()
 
     def flush(self):
         self.isFlushing = True
         self.getReply('FLUSH')
         self.isFlushing = False
 
+    def fetchProgramOutput(self):
+        """
+        Gets what the program printed since we last asked. The server only
+        keeps the latest part of it for us and tells us how much it had to
+        leave out.
+        """
+        self.updateWindow = False
+        self.resetNewData()
+        self.getReply('PROGOUT')
+        self.updateWindow = True
+        if self.replyStatus:
+            return
+
+        lines = self.programLineSplitter.feed(self.getNewData())
+        self.programOutput += lines
+        del self.programOutput[:-self.programOutputLines]
+        self.newProgramLines += lines
+        del self.newProgramLines[:-self.programOutputLines]
+
+    def printNewProgramLines(self):
+        buf = vim.current.buffer
+        if self.newProgramLines:
+            buf.append(self.newProgramLines)
+            self.newProgramLines = []
+        if len(buf) > self.programOutputLines:
+            del buf[:len(buf) - self.programOutputLines]
+
+    def showProgramOutput(self):
+        vim.current.buffer[:] = self.programOutput
+        self.newProgramLines = []
+
+    def showOutputHistory(self):
+        """
+        Fills the current buffer with everything GDB said while the
+        program ran, as far as the server still has it.
+        """
+        self.updateWindow = False
+        self.resetNewData()
+        self.getReply('HISTORY')
+        self.updateWindow = True
+        lines = [line for line in self.getNewData().splitlines()
+                 if not line.startswith('\x1a\x1a')]
+        vim.current.buffer[:] = lines
+
+    def sendProgramInput(self, text):
+        self.getReply('PROGIN %s\n' % text)
+
+    def fetchStopSnapshot(self, cmds):
+        """
+        Gets everything we want to show after the program stops in a single
+        round trip: the output which accumulated while the program ran, and
+        the results of the given MI and console commands. The results are
+        handed out by getSilentMiOutput() and getCommandOutput() when they
+        are asked to run the same commands, till dropStopSnapshot() is
+        called.
+        """
+        self.snapshot = {}
+        self.snapshotStale = False
+        self.inConversation = True
+        try:
+            flushTag = self.sendRequest('FLUSH')
+            # If the program is resumed before we get to it, there is
+            # nothing left to refresh.
+            snapshotTag = self.sendRequest(self.withPriority(
+                'SNAPSHOT %s' % '\n'.join(cmds), 'refresh', self.generation))
+
+            self.isFlushing = True
+            self.currentTag = flushTag
+            self.readReply(flushTag)
+            self.isFlushing = False
+
+            self.updateWindow = False
+            self.resetNewData()
+            self.currentTag = snapshotTag
+            self.readReply(snapshotTag)
+            self.updateWindow = True
+        except:
+            self.exception('Exception in getting the stop snapshot!')
+            self.isFlushing = False
+            self.updateWindow = True
+            self.inConversation = False
+            self.disconnect()
+            return
+        self.inConversation = False
+
+        if self.replyStatus == 'STALE':
+            self.snapshotStale = True
+        if self.replyStatus != '':
+            return
+
+        for (cmd, line) in zip(cmds, self.getNewData().splitlines()):
+            record, output = line.split('\t', 1)
+            self.snapshot[cmd] = (record, output.decode('string_escape'))
+
+    def dropStopSnapshot(self):
+        self.snapshot = {}
+
+    # ======================================================
+    # Balloon stuff
+    # ======================================================
+    def clearBalloonCache(self):
+        self.balloonCache.clear()
+
+    def balloonEval(self, expr, var):
+        """
+        Sets the given vim variable to what the balloon for expr should
+        show. Values are remembered till the program stops again or is
+        resumed, so hovering over the same thing again does not talk to
+        GDB at all.
+        """
+        key = (self.currentFrame, expr)
+        if key in self.balloonCache:
+            text = self.balloonCache.pop(key)
+            self.balloonCache[key] = text
+        elif self.isBusy():
+            text = ''
+        else:
+            self.updateWindow = False
+            self.resetNewData()
+            self.getReply('SYNC print %s' % expr)
+            self.updateWindow = True
+
+            m = re.search(r'\$\d+ = (.*?)\r', self.getNewData())
+            if m:
+                text = '%s = %s' % (expr, m.group(1))
+            else:
+                text = '%s = ' % expr
+
+            self.balloonCache[key] = text
+            while len(self.balloonCache) > self.balloonCacheSize:
+                self.balloonCache.popitem(last=False)
+
+        vim.command("let %s = '%s'" % (var, text.replace("'", "''")))
+
     # ======================================================
     # Variable stuff
     # ======================================================
     def addGdbVar(self, expr):
-        obj = self.getParsedGdbMiOutput('-var-create - @ %s' % expr)
+        obj = self.getParsedGdbMiOutput('-var-create - @ %s' % expr, MiVarObj)
         # ^done,name="var1",numchild="1",type="class CG::Scope *"
 
         if obj.numchild > 0:
@@ -268,7 +430,7 @@ class VimGdbClient:
         else:
             str = '   '
 
-        str += '%s <%s> {%s}' % (expr, obj.value, obj.name)
+        str += '%s <%s> {%s}' % (expr, cEscape(obj.value), obj.name)
 
         vim.current.buffer.append(str)
         vim.command('redraw')
@@ -280,7 +442,9 @@ class VimGdbClient:
             curLine = re.sub(r'\+', '-', curLine, 1)
             vim.current.line = curLine
 
-            lead_space = m.group(1)
+            # The first column says whether the variable changed. The
+            # children have not.
+            lead_space = re.sub(r'^c', ' ', m.group(1))
             varname = m.group(2)
 
             obj = self.getParsedGdbMiOutput('-var-list-children 1 %s' % varname)
@@ -297,7 +461,7 @@ class VimGdbClient:
                 else:
                     str += '  '
 
-                str += '%s <%s> {%s}' % (child.exp, child.value, child.name)
+                str += '%s <%s> {%s}' % (child.exp, cEscape(child.value), child.name)
 
                 lines.append(str)
 
@@ -312,7 +476,7 @@ class VimGdbClient:
             vim.current.line = curLine
 
             varname = m.group(2)
-            obj = self.getParsedGdbMiOutput('-var-delete -c %s' % varname)
+            self.getParsedGdbMiOutput('-var-delete -c %s' % varname)
 
     def deleteGdbVar(self):
         m = re.search(r'{(\S+)}$', vim.current.line)
@@ -320,44 +484,201 @@ class VimGdbClient:
             varname = m.group(1)
             self.getSilentMiOutput('-var-delete %s' % varname)
 
+    def getVarLineIndex(self):
+        """
+        Returns a map from varobj name to the (0 based) line showing it in
+        the current buffer. The map is only rebuilt when the buffer has
+        been changed by something other than refreshGdbVars().
+        """
+        tick = (vim.current.buffer.number, int(vim.eval('b:changedtick')))
+        if tick != self.varIndexTick:
+            self.varLineIndex = {}
+            lnum = 0
+            for line in vim.current.buffer:
+                if line.endswith('}'):
+                    start = line.rfind('{')
+                    if start != -1:
+                        self.varLineIndex[line[start+1:-1]] = lnum
+                lnum += 1
+            self.varIndexTick = tick
+
+        return self.varLineIndex
+
     def refreshGdbVars(self):
-        if len(vim.current.buffer) == 1:
+        buf = vim.current.buffer
+        if len(buf) == 1:
             return
 
         obj = self.getParsedGdbMiOutput('-var-update 1 *')
         # ^done,changelist=[{name="var1.public.foo1",value="0x401018 \"hello world\"",in_scope="true",type_changed="false"},{name="var1.public.foo4",value="8",in_scope="true",type_changed="false"}]
-        
+
+        index = self.getVarLineIndex()
+
+        # Lines are only changed in this map and written back to the
+        # buffer all at once at the end.
+        newLines = {}
+        def getLine(lnum):
+            if lnum in newLines:
+                return newLines[lnum]
+            return buf[lnum]
+
+        # remove all previous notifications.
+        for varname in self.markedVars:
+            lnum = index.get(varname)
+            if lnum is not None:
+                newLines[lnum] = ' ' + getLine(lnum)[1:]
+        self.markedVars = []
+
+        deletedLines = []
         changelist = obj.changelist
         for change in changelist:
             varname = change.name
             in_scope = change.in_scope
+            lnum = index.get(varname)
+            if in_scope == 'invalid':
+                if lnum is not None:
+                    deletedLines.append(lnum)
+                self.getSilentMiOutput('-var-delete %s' % varname)
+                continue
+
+            if lnum is None:
+                continue
+
+            line = getLine(lnum)
             if in_scope == 'true':
-                # escaping / is necessary otherwise the vim command fails
-                # silently!
-                value = str(change.value).replace('/', r'\/')
-                vim.command(r'g/{%s}$/s/<.\{-}>/<%s>/' % (varname, value))
-                vim.command(r'g/{%s}$/s/^ /c/' % varname)
+                start = line.find('<')
+                end = line.rfind('> {')
+                if start != -1 and end >= start:
+                    line = '%s<%s%s' % (line[:start], cEscape(change.value), line[end:])
+                line = 'c' + line[1:]
             elif in_scope == 'false':
-                vim.command(r'g/{%s}$/s/^ /o/' % varname)
-            elif in_scope == 'invalid':
-                vim.command(r'g/{%s}$/d_' % varname)
-                self.getSilentMiOutput('-var-delete %s' % varname)
+                line = 'o' + line[1:]
+            newLines[lnum] = line
+            self.markedVars.append(varname)
+
+        # Write back runs of consecutive lines with a single assignment
+        # each.
+        lnums = sorted(newLines.keys())
+        i = 0
+        while i < len(lnums):
+            j = i + 1
+            while j < len(lnums) and lnums[j] == lnums[j-1] + 1:
+                j += 1
+            buf[lnums[i]:lnums[j-1]+1] = [newLines[n] for n in lnums[i:j]]
+            i = j
+
+        if deletedLines:
+            for lnum in sorted(deletedLines, reverse=True):
+                del buf[lnum]
+            # Line numbers have shifted. Rebuild the index next time.
+            self.varIndexTick = None
+        else:
+            self.varIndexTick = (buf.number, int(vim.eval('b:changedtick')))
+
+    # ======================================================
+    # Shared library stuff
+    # ======================================================
+    def getLibsWithoutSymbols(self, stack):
+        """
+        Returns the shared libraries of the frames in the given
+        -stack-list-frames result which GDB knows nothing about.
+        """
+        libs = []
+        for item in stack:
+            frame = item.frame
+            if not (hasattr(frame, 'fullname') or hasattr(frame, 'file')) and \
+                    hasattr(frame, 'from_'):
+                libs.append(frame.from_)
+        return libs
+
+    def loadSharedLibs(self, libs):
+        """
+        Has GDB load the symbols of the given shared libraries unless we
+        did so already. Returns True if it loaded any.
+        """
+        libs = [lib for lib in set(libs) if lib not in self.loadedSharedLibs]
+        if not libs:
+            return False
+
+        # The argument of sharedlibrary is a basic regular expression.
+        cmds = ['sharedlibrary ^%s$' % re.sub(r'([][.*^$\\])', r'\\\1', lib)
+                for lib in libs]
+        start = time.time()
+        self.updateWindow = False
+        self.resetNewData()
+        self.getReply(self.withPriority('SNAPSHOT %s' % '\n'.join(cmds),
+                                        'refresh', self.generation))
+        self.updateWindow = True
+        if self.replyStatus != '':
+            return False
+
+        self.sharedLibLoadTime += time.time() - start
+        self.numSharedLibsLoaded += len(libs)
+        self.loadedSharedLibs.update(libs)
+        self.debug('loaded symbols of %s' % libs)
+        # We might know a lot more about the values we showed before.
+        self.clearBalloonCache()
+        return True
+
+    def loadSharedLibsForStack(self, numFrames):
+        """
+        Loads the symbols of the shared libraries of the innermost
+        numFrames+1 frames, which are what we are about to show.
+        """
+        cmd = '-stack-list-frames 0 %d' % numFrames
+        try:
+            if cmd in self.snapshot:
+                # Leave it for the stack window if nothing changes.
+                obj = parseGdbMi(self.snapshot[cmd][0], typed=True)
+            else:
+                obj = self.getParsedGdbMiOutput(cmd)
+            libs = self.getLibsWithoutSymbols(obj.stack)
+        except:
+            return
+
+        if self.loadSharedLibs(libs):
+            # What we got about the frames when the program stopped is out
+            # of date.
+            for key in self.snapshot.keys():
+                if key.startswith('-stack-'):
+                    del self.snapshot[key]
+
+    def getSharedLibReport(self):
+        """
+        Returns a message saying how much time we saved by loading the
+        symbols of only the shared libraries we needed.
+        """
+        numSkipped = 0
+        if not self.isBusy():
+            self.updateWindow = False
+            out = self.runCommand('info sharedlibrary')
+            self.updateWindow = True
+            numSkipped = len(re.findall(r'\sNo\s+\S.*$', out, re.M))
+
+        numLoaded = self.numSharedLibsLoaded
+        msg = 'Loaded the symbols of %d shared libraries in %.1fs and skipped %d' % (
+            numLoaded, self.sharedLibLoadTime, numSkipped)
+        if numLoaded and numSkipped:
+            msg += ', saving about %.1fs' % (self.sharedLibLoadTime / numLoaded * numSkipped)
+        return msg
 
     # ======================================================
     # Stack stuff
     # ======================================================
     def gotoCurrentFrame(self):
+        self.currentFrame = None
         try:
             out = self.getParsedGdbMiOutput('-stack-info-frame')
             file = out.frame.fullname
             line = out.frame.line
             level = out.frame.level
+            self.currentFrame = (level, out.frame.addr)
             # ^done,frame={level="0",addr="0x00002aaab80758c5",func="cdr_transform_driver_pre_core",file="cdr/cdr_transform_driver.cpp",fullname="/mathworks/devel/sandbox/savadhan/Acgirb/matlab/toolbox/stateflow/src/stateflow/cdr/cdr_transform_driver.cpp",line="263"}
         except:
             return
 
         vim.eval('gdb#gdb#RefreshStackPtr(%d)' % level)
-        vim.eval('gdb#gdb#PlaceSign("%s", %d)' % (file, line))
+        vim.eval('gdb#gdb#PlaceSign("%s", %d)' % (cEscape(file), line))
 
     def expandStack(self, num, skipUnknownFrames=True):
 
@@ -371,7 +692,12 @@ class VimGdbClient:
             else:
                 return
 
-        obj = self.getParsedGdbMiOutput('-stack-list-frames %d %d' % (nextFrameToShow, nextFrameToShow+num-1))
+        cmd = '-stack-list-frames %d %d' % (nextFrameToShow, nextFrameToShow+num-1)
+        obj = self.getParsedGdbMiOutput(cmd)
+        # Frames are shown with their source once we have the symbols of
+        # their libraries.
+        if self.lazySharedLibs and self.loadSharedLibs(self.getLibsWithoutSymbols(obj.stack)):
+            obj = self.getParsedGdbMiOutput(cmd)
         # ^done,stack=[frame={level="0",addr="0x0000000000400a1c",func="foo",file="vartest.cpp",fullname="/mathworks/home/savadhan/code/gdbmiserver/test/vartest.cpp",line="26"},frame={level="1",addr="0x0000000000400d01",func="main",file="vartest.cpp",fullname="/mathworks/home/savadhan/code/gdbmiserver/test/vartest.cpp",line="52"}]
 
         lastIsKnown = isEmpty or (not re.match(r'...skipping', vim.current.buffer[-2]))
@@ -380,9 +706,9 @@ class VimGdbClient:
         for item in obj.stack:
             frame = item.frame
             filename = ''
-            if 'fullname' in frame.__dict__:
+            if hasattr(frame, 'fullname'):
                 filename = frame.fullname
-            elif 'file' in frame.__dict__:
+            elif hasattr(frame, 'file'):
                 filename = frame.file
 
             if filename:
@@ -394,8 +720,8 @@ class VimGdbClient:
                     if lastIsKnown:
                         lines.append('...skipping frames with no source information...')
 
-                elif 'from' in frame.__dict__:
-                    lines.append('  #%-3d ?? from ...%s' % (frame.level, frame.__dict__['from'][-20:]))
+                elif hasattr(frame, 'from_'):
+                    lines.append('  #%-3d ?? from ...%s' % (frame.level, frame.from_[-20:]))
 
                 else:
                     lines.append('  #%-3d ??' % frame.level)
@@ -10,20 +10,27 @@ except:
     pass
 
 class VimGdbServer(GdbServer):
-    def __init__(self, vimServerName, gdbcmd):
-        GdbServer.__init__(self, gdbcmd)
+    def __init__(self, vimServerName, gdbcmd, useMiChannel=True, useTcp=False,
+                 programTty=False, programLog=None, outputLog=None):
+        GdbServer.__init__(self, gdbcmd, useMiChannel, useTcp=useTcp,
+                           programTty=programTty, programLog=programLog,
+                           outputLog=outputLog)
         self.vimServerName = vimServerName
 
     def getQueryAnswer(self, query):
         self.debug('sending GetQueryAnswer for [%s] command to VIM' % query)
 
-        if self.vimServerName:
-            ans = Popen(['vim', '--servername', self.vimServerName, 
-                         '--remote-expr', 
-                         'gdb#gdb#GetQueryAnswer("%s")' % query], 
-                        stdout=PIPE).communicate()[0]
-        else:
-            ans = vim.eval('gdb#gdb#GetQueryAnswer("%s")' % query)
+        # A client which is subscribed to our events can answer the query
+        # without us having to start another VIM process to ask it.
+        ans = self.askSubscriber('QUERY', query)
+        if ans is None:
+            if self.vimServerName:
+                ans = Popen(['vim', '--servername', self.vimServerName, 
+                             '--remote-expr', 
+                             'gdb#gdb#GetQueryAnswer("%s")' % query], 
+                            stdout=PIPE).communicate()[0]
+            else:
+                ans = vim.eval('gdb#gdb#GetQueryAnswer("%s")' % query)
 
         self.debug("done receiving reply '%s' from VIM about GetQueryAnswer" % ans)
         return ans
@@ -31,28 +38,35 @@ class VimGdbServer(GdbServer):
     def onResume(self):
         self.debug('sending onResume command to VIM')
 
-        if self.vimServerName:
-            cmd = "vim --servername %s --remote-expr 'gdb#gdb#OnResume()'" % self.vimServerName
-            commands.getoutput(cmd)
-        else:
-            vim.eval('gdb#gdb#OnResume()')
+        # A subscribed client gets told over the connection it already
+        # has. Otherwise we have to go through VIM's client-server
+        # mechanism.
+        if not self.pushEvent('RESUME', str(self.generation)):
+            if self.vimServerName:
+                cmd = "vim --servername %s --remote-expr 'gdb#gdb#OnResume()'" % self.vimServerName
+                commands.getoutput(cmd)
+            else:
+                vim.eval('gdb#gdb#OnResume()')
 
         self.debug('done receiving reply from VIM about onResume')
 
 class VimServerThread(Thread):
-    def __init__(self, vimServerName, gdbcmd):
+    def __init__(self, vimServerName, gdbcmd, useMiChannel, useTcp, programTty,
+                 programLog, outputLog):
         Thread.__init__(self)
-        self.server = VimGdbServer(vimServerName, gdbcmd)
+        self.server = VimGdbServer(vimServerName, gdbcmd, useMiChannel, useTcp,
+                                   programTty, programLog, outputLog)
 
     def run(self):
         self.server.run()
 
-def startVimServerThread(serverName, gdbcmd):
-    import time
-    s = VimServerThread(serverName, gdbcmd)
+def startVimServerThread(serverName, gdbcmd, useMiChannel=True, useTcp=False,
+                         programTty=False, programLog='', outputLog=''):
+    s = VimServerThread(serverName, gdbcmd, useMiChannel, useTcp,
+                        programTty, programLog or None, outputLog or None)
     s.start()
-    # return the port number
-    return s.server.socket.getsockname()[1]
+    # return the address to connect to
+    return s.server.getAddress()
 
 if __name__ == '__main__':
     from optparse import OptionParser
@@ -60,6 +74,7 @@ if __name__ == '__main__':
     parser = OptionParser()
     parser.add_option('-d', '--debug', dest="debug")
     parser.add_option('', '--gdbcmd', dest="gdbcmd", default="gdb")
+    parser.add_option('', '--no-mi-channel', dest="useMiChannel", action="store_false", default=True)
     (opts, args) = parser.parse_args()
 
     if opts.debug:
@@ -72,5 +87,5 @@ if __name__ == '__main__':
         logger.addHandler(handler)
         logger.setLevel(logging.DEBUG)
 
-    s = VimGdbServer(sys.argv[1], opts.gdbcmd)
+    s = VimGdbServer(sys.argv[1], opts.gdbcmd, opts.useMiChannel)
     s.run()
@@ -27,16 +27,48 @@ call gdb#gdb#Let('GdbRunOnStart', 1)
 call gdb#gdb#Let('GdbQuitOnProgramFinish', 0)
 call gdb#gdb#Let('GdbLogging', 0)
 call gdb#gdb#Let('GdbCmd', 'gdb')
+call gdb#gdb#Let('GdbUseMiChannel', 1)
+" Talk to GDB over a TCP port instead of a Unix domain socket.
+call gdb#gdb#Let('GdbUseTcp', 0)
+call gdb#gdb#Let('GdbEventPollInterval', 50)
+call gdb#gdb#Let('GdbBalloonCacheSize', 256)
+call gdb#gdb#Let('GdbCmdWinUpdateInterval', 50)
+" Get GDBs which have already loaded the program from GdbPool.py. Needs
+" +timers and is ignored without.
+call gdb#gdb#Let('GdbUsePool', 0)
+call gdb#gdb#Let('GdbPoolMemoryBudget', 4096)
+call gdb#gdb#Let('GdbLazySharedLibs', 0)
+" Give the program a terminal of its own instead of sharing GDB's. What it
+" prints is then only shown in the program output window (see
+" gdb#gdb#ShowProgramOutput()) and it reads its input from
+" gdb#gdb#SendProgramInput().
+call gdb#gdb#Let('GdbProgramTty', 0)
+" Also write what the program prints to this file.
+call gdb#gdb#Let('GdbProgramLog', '')
+call gdb#gdb#Let('GdbProgramOutputLines', 10000)
+call gdb#gdb#Let('GdbProgramOutputWinName', '_GDB_Program_Output_')
+" Also write what GDB says while the program runs to this file. Only the
+" latest part of it is kept in memory. See gdb#gdb#ShowOutputHistory()
+call gdb#gdb#Let('GdbOutputLog', '')
+call gdb#gdb#Let('GdbOutputHistoryWinName', '_GDB_Output_History_')
 " }}}
 
 " Script local variables {{{
 let s:userIsBusy = 0
 let s:gdbStarted = 0
+" Set once GDB has shown its first prompt. See gdb#gdb#OnReady()
+let s:gdbReady = 0
+" Commands to run as soon as GDB is ready.
+let s:commandsOnReady = []
+" Set if we got a GDB from the pool which was started with the program.
+let s:fileLoadedByPool = 0
 let s:scriptDir = expand('<sfile>:p:h')
 
 let s:GdbCmdWinName = g:GdbCmdWinName
 let s:GdbStackWinName = g:GdbStackWinName
 let s:GdbVarWinName = g:GdbVarWinName
+let s:GdbProgramOutputWinName = g:GdbProgramOutputWinName
+let s:GdbOutputHistoryWinName = g:GdbOutputHistoryWinName
 
 let s:GdbCmdWinBufNum = -1
 let s:GdbStackWinBufNum = -1
@@ -61,6 +93,7 @@ function! s:GdbInitWork( )
     endif
 
     let s:gdbStarted = 1
+    let s:gdbReady = 0
     let s:GdbCmdWinBufNum = gdb#gdb#GdbOpenWindow(s:GdbCmdWinName)
     setlocal filetype=gdbvim
     exec "nmap <buffer> <silent> <CR>           :call gdb#gdb#GotoSelectedFrame()<CR>"
@@ -81,31 +114,41 @@ function! s:GdbInitWork( )
             return
         end
         let loggingArg = g:GdbLogging ? ' --debug ' : ''
-        silent! exec '!xterm -T GDB -e python '.s:scriptDir.'/VimGdbServer.py '.loggingArg.v:servername.' &'
+        let miArg = g:GdbUseMiChannel ? '' : ' --no-mi-channel '
+        silent! exec '!xterm -T GDB -e python '.s:scriptDir.'/VimGdbServer.py '.loggingArg.miArg.v:servername.' &'
         silent! sleep 2
     else
+        python serverAddress = None
+        let s:fileLoadedByPool = 0
+        let gdbFile = matchstr(g:GdbFileToRun, '^\S\+')
+        " A GDB from the pool does not know our v:servername, so it
+        " cannot tell us that the program stopped or ask us to answer a
+        " query by itself. Only the timers which poll it would notice.
+        if g:GdbUsePool && has('timers') && gdbFile != ''
+            " Get a GDB which has already loaded the program from the
+            " pool. See GdbPool.py
+            python from GdbPool import getPooledServerAddress
+            exec 'python serverAddress = getPooledServerAddress("'.g:GdbCmd.'", "'.gdbFile.'", '.g:GdbPoolMemoryBudget.', 2.0, '.g:GdbUseMiChannel.', '.g:GdbProgramTty.', "'.escape(g:GdbProgramLog, '\"').'", "'.escape(g:GdbOutputLog, '\"').'")'
+            python vim.command('let s:fileLoadedByPool = %d' % (serverAddress is not None))
+        endif
         python from VimGdbServer import startVimServerThread
-        exec 'python portNum = startVimServerThread("'.v:servername.'", "'.g:GdbCmd.'")'
+        exec 'python if serverAddress is None: serverAddress = startVimServerThread("'.v:servername.'", "'.g:GdbCmd.'", '.g:GdbUseMiChannel.', '.g:GdbUseTcp.', '.g:GdbProgramTty.', "'.escape(g:GdbProgramLog, '\"').'", "'.escape(g:GdbOutputLog, '\"').'")'
     endif
 
-    python gdbClient = VimGdbClient(portNum)
-    python gdbClient.flush()
+    python gdbClient = VimGdbClient(serverAddress)
+    exec 'python gdbClient.balloonCacheSize = '.g:GdbBalloonCacheSize
+    exec 'python gdbClient.cmdWinUpdateInterval = '.g:GdbCmdWinUpdateInterval.'/1000.0'
+    exec 'python gdbClient.lazySharedLibs = '.g:GdbLazySharedLibs
+    exec 'python gdbClient.programOutputLines = '.g:GdbProgramOutputLines
+
+    " Have the server tell us when the program stops over the connection
+    " we already have instead of starting a new VIM process to do it. It
+    " also tells us when GDB is ready. Without timers we only look at the
+    " events while we wait for GDB to start up. See below.
+    python gdbClient.subscribe()
     
     g/^\s*$/d_
 
-    " prevent stupid press <return> to continue prompts.
-    " call gdb#gdb#RunCommand('set height 0')
-    call s:GdbGetCommandOutputSilent('set height 0')
-
-    " If file is given, load it.
-    if g:GdbFileToRun != ''
-        let gdbFile = matchstr(g:GdbFileToRun, '^\S\+')
-        if gdbFile != ''
-            call gdb#gdb#RunCommand('file '.gdbFile)
-        endif
-    endif
-    call gdb#gdb#RedoAllBreakpoints()
-
     augroup TerminateGdb
         au!
         au VimLeavePre * :call gdb#gdb#Terminate()
@@ -129,6 +172,58 @@ function! s:GdbInitWork( )
 
     call s:CreateGdbMaps()
 
+    " GDB starts up in the background, which can take a long while if it
+    " has to load the symbols of a large program. We show what it says
+    " meanwhile and do the rest in gdb#gdb#OnReady(). Without timers, all
+    " we can do is wait. Nobody would look at the events after that, so
+    " the server has to go through VIM's client-server mechanism instead.
+    if has('timers')
+        let s:eventTimer = timer_start(g:GdbEventPollInterval, 'gdb#gdb#PollEvents', {'repeat': -1})
+    else
+        python gdbClient.waitUntilReady()
+        python gdbClient.unsubscribe()
+    endif
+    wincmd w
+endfunction " }}}
+" gdb#gdb#OnReady: finishes initialization once GDB has started {{{
+" Description: Called when the server tells us that GDB has shown its
+" first prompt. Breakpoints set in the meantime were only remembered as
+" signs and are given to GDB here.
+function! gdb#gdb#OnReady()
+    if s:gdbReady
+        return
+    endif
+    let s:gdbReady = 1
+
+    " Show whatever is left of what GDB said while starting up.
+    python gdbClient.flush()
+
+    " prevent stupid press <return> to continue prompts.
+    " call gdb#gdb#RunCommand('set height 0')
+    call s:GdbGetCommandOutputSilent('set height 0')
+
+    " Most of the time GDB spends starting a program with a lot of shared
+    " libraries goes into loading their symbols. Only load those we need
+    " to show the stack. Breakpoints in the others stay pending till then.
+    if g:GdbLazySharedLibs
+        call s:GdbGetCommandOutputSilent('set auto-solib-add off')
+    endif
+
+    " If file is given, load it unless GDB was started with it.
+    if g:GdbFileToRun != '' && !s:fileLoadedByPool
+        let gdbFile = matchstr(g:GdbFileToRun, '^\S\+')
+        if gdbFile != ''
+            call gdb#gdb#RunCommand('file '.gdbFile)
+        endif
+    endif
+    call gdb#gdb#RedoAllBreakpoints()
+
+    let cmds = s:commandsOnReady
+    let s:commandsOnReady = []
+    for cmd in cmds
+        call gdb#gdb#RunCommand(cmd)
+    endfor
+
     " Run the inferior. This needs to be done after all other stuff is done
     " so that if we immediately come back after hitting a breakpoint, we
     " are ready.
@@ -136,7 +231,6 @@ function! s:GdbInitWork( )
         let gdbRunArgs = matchstr(g:GdbFileToRun, '^\S\+\(\s\+\)\=\zs.*')
         call gdb#gdb#ResumeProgram('run '.gdbRunArgs)		
     end
-    wincmd w
 endfunction " }}}
 " gdb#gdb#Init: {{{
 function! gdb#gdb#Init()
@@ -271,10 +365,12 @@ endfunction " }}}
 function! gdb#gdb#Panic()
     let ch = confirm('You should only panic if you see client-server errors. Are you sure you want to panic?', "&Panic\n&Dont", 1)
     if ch == 1
+        call s:StopPollingEvents()
         call s:CloseAllGdbWindows()
         sign unplace 1
         set balloonexpr=
         let s:gdbStarted = 0
+        let s:gdbReady = 0
     endif
 endfunction " }}}
 " gdb#gdb#ShowCmdWindow:  {{{
@@ -289,6 +385,32 @@ function! gdb#gdb#ShowCmdWindow()
     let s:GdbCmdWinBufNum = gdb#gdb#GdbOpenWindow(s:GdbCmdWinName)
     setlocal filetype=gdbvim
 endfunction " }}}
+" gdb#gdb#ShowProgramOutput: shows what the program printed {{{
+" Description: Only works if the program has a terminal of its own. See
+" g:GdbProgramTty.
+function! gdb#gdb#ShowProgramOutput()
+    if s:gdbStarted != 1
+        echohl Search
+        echomsg "Gdb is not started!"
+        echohl None
+        return
+    endif
+    call gdb#gdb#GdbOpenWindow(s:GdbProgramOutputWinName)
+    python gdbClient.showProgramOutput()
+    normal! G
+endfunction " }}}
+" gdb#gdb#ShowOutputHistory: shows what GDB said while the program ran {{{
+" Description: The command window only gets the latest part of it if the
+" program ran for a long time. This shows all of it, if g:GdbOutputLog is
+" set.
+function! gdb#gdb#ShowOutputHistory()
+    if s:GdbWarnIfNotStarted()
+        return
+    endif
+    call gdb#gdb#GdbOpenWindow(s:GdbOutputHistoryWinName)
+    python gdbClient.showOutputHistory()
+    normal! G
+endfunction " }}}
 " }}}
 
 " Updating the _GDB_ window dynamically. {{{
@@ -305,9 +427,11 @@ function! gdb#gdb#UpdateCmdWin()
 
     let presWinNr = winnr()
 
-    " If the Gdb command window is not open, don't do anything.
+    " If the Gdb command window is not open, there is nowhere to show the
+    " output, so do not let it pile up either.
     let gdbWinNr = bufwinnr(s:GdbCmdWinBufNum)
     if gdbWinNr == -1
+        python gdbClient.newLines = []
         return
     endif
 
@@ -321,6 +445,40 @@ function! gdb#gdb#UpdateCmdWin()
 
     redraw
 endfunction " }}}
+" gdb#gdb#OnProgramOutput: {{{
+" Description: Called when the program printed something. Like
+" gdb#gdb#UpdateCmdWin(), we only append to the window if it is open.
+function! gdb#gdb#OnProgramOutput()
+    let bufnum = get(s:gdbNametoBufNumMap, s:GdbProgramOutputWinName, -1)
+    let outWinNr = bufwinnr(bufnum)
+    if outWinNr == -1
+        " Whatever we have is shown when the window is opened.
+        python gdbClient.newProgramLines = []
+        return
+    endif
+
+    let presWinNr = winnr()
+    exec outWinNr.' wincmd w'
+    python gdbClient.printNewProgramLines()
+    normal! G
+    if outWinNr != presWinNr
+        wincmd p
+    endif
+
+    redraw
+endfunction " }}}
+" gdb#gdb#SendProgramInput: types a line on the terminal of the program {{{
+" Description: 
+function! gdb#gdb#SendProgramInput(text)
+    if s:GdbWarnIfNotStarted()
+        return
+    endif
+    let text = a:text
+    if text == ''
+        let text = input('Program input: ')
+    endif
+    python gdbClient.sendProgramInput(vim.eval('l:text'))
+endfunction " }}}
 " gdb#gdb#OnResume: {{{
 function! gdb#gdb#OnResume()
     " This function gets called when the background GDB process regains
@@ -328,9 +486,27 @@ function! gdb#gdb#OnResume()
     " probably just go to the current frame when this happens.
     " call Debug('+gdb#gdb#OnResume', 'gdb')
 
+    " Ask GDB about everything we are going to refresh below in one go.
+    " This also gets us the output the program produced while it ran.
+    call s:FetchStopSnapshot()
+    " The program was resumed again before we got to it. We will be called
+    " again when it stops.
+    py vim.command('let stale = %d' % gdbClient.snapshotStale)
+    if stale
+        return
+    endif
+    " Whatever values we have shown in balloons before are stale now.
+    python gdbClient.clearBalloonCache()
+    if g:GdbLazySharedLibs
+        let stackWinNr = bufwinnr(s:GdbStackWinBufNum)
+        let numFrames = stackWinNr != -1 ? winheight(stackWinNr)-2 : 0
+        exec 'python gdbClient.loadSharedLibsForStack('.numFrames.')'
+    endif
+
     if g:GdbQuitOnProgramFinish
         let progInfo = s:GdbGetCommandOutputSilent('info program')
         if progInfo =~ 'not being run'
+            python gdbClient.dropStopSnapshot()
             call gdb#gdb#Terminate()
             return
         endif
@@ -340,7 +516,6 @@ function! gdb#gdb#OnResume()
     " We want to make sure that the command window shows the latest stuff
     " when we are given control. Too bad if the user is busy typing
     " something while this is going on.
-    python gdbClient.flush()
     call gdb#gdb#UpdateCmdWin()
     call gdb#gdb#GotoCurFrame()
 
@@ -349,6 +524,7 @@ function! gdb#gdb#OnResume()
 
     call gdb#gdb#RefreshStack()
     call gdb#gdb#RefreshGdbVars()
+    python gdbClient.dropStopSnapshot()
 
     exec bufwinnr(bufnum).' wincmd w'
     call setpos('.', pos)
@@ -356,6 +532,43 @@ function! gdb#gdb#OnResume()
     call foreground()
     redraw
 endfunction " }}}
+" s:FetchStopSnapshot: gets what OnResume needs in one round trip {{{
+" Description: The commands have to be exactly the ones which the refresh
+" functions called by gdb#gdb#OnResume() end up running.
+function! s:FetchStopSnapshot()
+    let cmds = ['-stack-info-frame']
+    if g:GdbQuitOnProgramFinish
+        call add(cmds, 'info program')
+    endif
+    let stackWinNr = bufwinnr(s:GdbStackWinBufNum)
+    if stackWinNr != -1
+        " See gdb#gdb#ShowStack()
+        call add(cmds, '-stack-list-frames 0 '.(winheight(stackWinNr)-2))
+    endif
+    if bufwinnr(s:GdbVarWinBufNum) != -1
+        call add(cmds, '-var-update 1 *')
+    endif
+    python gdbClient.fetchStopSnapshot(vim.eval('l:cmds'))
+endfunction " }}}
+" gdb#gdb#PollEvents: handles events pushed by the server {{{
+" Description: Called periodically by a timer. The server tells us about
+" the program stopping (and asks questions while it is running) by pushing
+" events over the client connection.
+function! gdb#gdb#PollEvents(timer)
+    python gdbClient.pollEvents()
+    " Show what GDB says while it starts up.
+    if s:gdbStarted && !s:gdbReady
+        python gdbClient.flush()
+    endif
+endfunction " }}}
+" s:StopPollingEvents:  {{{
+" Description: 
+function! s:StopPollingEvents()
+    if exists('s:eventTimer')
+        call timer_stop(s:eventTimer)
+        unlet s:eventTimer
+    endif
+endfunction " }}}
 " gdb#gdb#GetQueryAnswer:  {{{
 " Description: 
 function! gdb#gdb#GetQueryAnswer(query)
@@ -415,7 +628,7 @@ function! gdb#gdb#RunCommand(cmd)
     " have multiple on going connections to it.
     let oldBE = &ballooneval
     set noballooneval
-    exec 'python gdbClient.runCommand("""'.cmd.'""")'
+    exec 'python gdbClient.runUserCommand("""'.cmd.'""")'
     call s:SetCurPos(pos)
     let &ballooneval = oldBE
 
@@ -426,12 +639,21 @@ endfunction " }}}
 " gdb#gdb#Terminate: terminates the running GDB thread {{{
 function! gdb#gdb#Terminate()
     if s:gdbStarted == 1
+        let report = ''
+        if g:GdbLazySharedLibs && s:gdbReady
+            python vim.command("let report = '%s'" % gdbClient.getSharedLibReport())
+        endif
         sign unplace 1
         set balloonexpr=
+        call s:StopPollingEvents()
         python gdbClient.terminate()
         call s:RestoreUserMaps()
         call s:CloseAllGdbWindows()
         let s:gdbStarted = 0
+        let s:gdbReady = 0
+        if report != ''
+            echomsg report
+        endif
     end
 endfunction " }}}
 " gdb#gdb#PlaceSign: places a sign at a given location {{{
@@ -471,6 +693,12 @@ function! s:GdbWarnIfBusy()
     if s:GdbWarnIfNotStarted()
         return 1
     endif
+    if !s:gdbReady
+        echohl Search
+        echomsg "Gdb is still starting up. Try again once it is ready."
+        echohl None
+        return 1
+    endif
     if gdb#gdb#IsBusy()
         echohl Search
         echomsg "Gdb is busy. Interrupt the program or try again later."
@@ -646,8 +874,10 @@ function! s:SetBreakPointAt(fname, lnum, prevbps)
     " network drives.
     let fnameTail = fnamemodify(a:fname, ':t')
     
+    " Till GDB is ready, we only place the sign. gdb#gdb#OnReady() sets
+    " the breakpoint in GDB.
     let gdbBpNum = -1
-    if s:gdbStarted
+    if s:gdbReady
         if s:GdbWarnIfBusy()
             return
         endif
@@ -704,7 +934,7 @@ function! gdb#gdb#ClearBreakPoint()
     let signId = s:GetSignIdForFileLine(expand('%:p'), line('.'))
     echomsg "removing sign ".signId
 
-    if s:gdbStarted == 1
+    if s:gdbReady
         if s:GdbWarnIfBusy()
             return
         endif
@@ -881,7 +1111,11 @@ function! gdb#gdb#Attach(pid)
     if s:gdbStarted == 0
         call s:GdbInitWork()
     endif
-    call gdb#gdb#RunCommand('attach '.pid)
+    if s:gdbReady
+        call gdb#gdb#RunCommand('attach '.pid)
+    else
+        call add(s:commandsOnReady, 'attach '.pid)
+    endif
 endfunction " }}}
 " gdb#gdb#ResumeProgram: gives control back to the inferior program {{{
 " Description: This should be used for GDB commands which could potentially
@@ -956,6 +1190,11 @@ function! gdb#gdb#Interrupt( )
         return
     endif
     python gdbClient.interrupt()
+    " Interrupting GDB while it starts up only stops it loading symbols.
+    " It tells us when it is ready.
+    if !s:gdbReady
+        return
+    endif
     call gdb#gdb#OnResume()
 endfunction " }}}
 " gdb#gdb#Kill: kills the inferior {{{
@@ -979,13 +1218,11 @@ endfunction " }}}
 " Balloon expression {{{
 " gdb#gdb#BalloonExpr: balloonexpr for GDB {{{
 function! gdb#gdb#BalloonExpr()
-    if gdb#gdb#IsBusy()
-        return ''
-    endif
     let str = s:GetContingString(v:beval_bufnr, v:beval_lnum, v:beval_col)
-    let eval = s:GdbGetCommandOutputSilent('print '.str)
-    let eval =  matchstr(eval, '\$\d\+ = \zs.\{-}\ze\r')
-    return str.' = '.eval
+    " The client remembers values till the program stops or resumes, so
+    " this mostly does not need GDB.
+    python gdbClient.balloonEval(vim.eval('l:str'), 'l:retval')
+    return retval
 endfunction " }}}
 " gdb#gdb#PrintExpr: prints the expression under cursor {{{
 " Description:  
@@ -1105,8 +1342,6 @@ endfunction " }}}
 function! gdb#gdb#RefreshGdbVars()
     if bufwinnr(s:GdbVarWinBufNum) != -1
         call gdb#gdb#OpenGdbVarsWindow()
-        " remove all previous notifications.
-        %s/^[^#]/ /
         python gdbClient.refreshGdbVars()
     endif
 endfunction " }}}
@@ -1,10 +1,362 @@
+import os
+import stat
+import errno
+import socket
+import select
+import threading
+import itertools
+import collections
+
+# Servers and clients on the same machine talk over Unix domain sockets
+# in a directory only the user can get into, so nobody else can connect
+# to their GDB. TCP on the loopback interface is still there for those who
+# want it. An address is a port number for TCP and a path otherwise.
+
+def getSocketDir():
+    """
+    Returns the directory our Unix domain sockets live in, creating it if
+    need be.
+    """
+    base = os.getenv('XDG_RUNTIME_DIR') or '/tmp'
+    dirName = os.path.join(base, 'VimGdb.%d' % os.getuid())
+    try:
+        os.mkdir(dirName, 0700)
+    except OSError, e:
+        if e.errno != errno.EEXIST:
+            raise
+
+    # Somebody else could have made it before us.
+    st = os.lstat(dirName)
+    if not stat.S_ISDIR(st.st_mode) or st.st_uid != os.getuid() or st.st_mode & 077:
+        raise RuntimeError, "%s is not a directory only we can get into" % dirName
+    return dirName
+
+socketCounter = itertools.count(1)
+
+def makeListeningSocket(useTcp=False, name=None):
+    """
+    Returns a socket bound to a fresh address. Unix domain sockets get the
+    given name in getSocketDir() or one of their own.
+    """
+    if useTcp:
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        # The magic line below prevents the socket from throwing the
+        # "socket already in use" address which results in a timeout of
+        # about 30 seconds between successive invocations of this program.
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        # Use 0 to let the OS give us an unused port number. Otherwise, we
+        # cannot have two simultaneous debugging sessions on the same
+        # machine!
+        sock.bind(('127.0.0.1', 0))
+        return sock
+
+    if name is None:
+        name = 'gdb.%d.%d' % (os.getpid(), socketCounter.next())
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.bind(os.path.join(getSocketDir(), name))
+    return sock
+
+def getSocketAddress(sock):
+    if sock.family == socket.AF_UNIX:
+        return sock.getsockname()
+    return sock.getsockname()[1]
+
+def closeListeningSocket(sock):
+    """
+    Closes a socket made by makeListeningSocket() and removes its file.
+    """
+    address = getSocketAddress(sock)
+    sock.close()
+    if isinstance(address, str):
+        try:
+            os.remove(address)
+        except OSError:
+            pass
+
+def connectTo(address):
+    """
+    Returns a socket connected to the given address.
+    """
+    if isinstance(address, str):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    else:
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        address = ('127.0.0.1', address)
+    try:
+        sock.connect(address)
+    except:
+        sock.close()
+        raise
+    return sock
+
+def parseAddress(text):
+    """
+    Turns an address which was passed around as a string back into one.
+    """
+    if text.isdigit():
+        return int(text)
+    return text
+
 def sendData(conn, data):
-    # print 'seinding [%s]' % data
-    data_len = len(data)
+    # A memoryview lets us send what is left of a large string without
+    # copying it every time the socket takes only part of it.
+    view = memoryview(data)
     total_sent = 0
-    while total_sent < data_len:
-        sent = conn.send(data[total_sent:])
+    while total_sent < len(data):
+        sent = conn.send(view[total_sent:])
         if sent == 0:
             raise RuntimeError, "Socket connection broken by client!"
         total_sent += sent
 
+# Payloads bigger than this are sent on their own instead of being copied
+# into one string with their header.
+MAX_COPIED_PAYLOAD = 16*1024
+
+class MsgConnection:
+    """
+    A long lived connection between the client and the server which
+    carries framed messages. Every message looks like
+
+        <tag> <kind> <length>\\n<payload>
+
+    where tag is a number chosen by the client for each request. The
+    server tags every message it sends in reply to a request with the same
+    tag so that the client can send several requests before reading the
+    replies to any of them.
+
+    By default, sendMsg() returns once the message is on its way. See
+    startSender() for sending from a thread of our own instead.
+    """
+    def __init__(self, sock):
+        self.sock = sock
+        # Replies are usually a couple of small messages. Do not let Nagle
+        # hold back the second one till the first one is acknowledged.
+        if sock.family == socket.AF_INET:
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.sendLock = threading.Lock()
+        # What we have received but not yet handed out. We receive into
+        # recvBuf, which is allocated only once.
+        self.buffer = bytearray()
+        self.recvBuf = bytearray(65536)
+        # Messages waiting for the sender thread. See startSender().
+        self.outbox = None
+
+    def fileno(self):
+        return self.sock.fileno()
+
+    def startSender(self, maxQueued, onDrained=None):
+        """
+        From now on, messages are sent by a thread of our own, so that
+        whoever sends them does not have to wait for a slow reader on the
+        other side. At most about maxQueued bytes are kept waiting: past
+        that, sendMsg() waits for the backlog to go down, while queueMsg()
+        never waits and leaves it to the caller to stop producing. Once
+        the backlog is down to half of maxQueued again, onDrained() is
+        called from the sender thread.
+        """
+        self.outbox = collections.deque()
+        self.numQueued = 0
+        # Set while the sender thread is sending a message it took out of
+        # the outbox.
+        self.sending = False
+        self.maxQueued = maxQueued
+        self.onDrained = onDrained
+        self.broken = False
+        self.closing = False
+        # A plain lock is a lot cheaper than the default RLock.
+        self.outboxCond = threading.Condition(threading.Lock())
+        self.sender = threading.Thread(target=self.runSender)
+        self.sender.setDaemon(True)
+        self.sender.start()
+
+    def makeMsg(self, tag, kind, payload):
+        header = '%d %s %d\n' % (tag, kind, len(payload))
+        if len(payload) <= MAX_COPIED_PAYLOAD:
+            return (header + payload,)
+        return (header, payload)
+
+    def sendMsg(self, tag, kind, payload=''):
+        msg = self.makeMsg(tag, kind, payload)
+        if self.outbox is None:
+            self.sendLock.acquire()
+            try:
+                for data in msg:
+                    sendData(self.sock, data)
+            finally:
+                self.sendLock.release()
+            return
+
+        self.outboxCond.acquire()
+        try:
+            while self.isFull() and not self.broken:
+                self.outboxCond.wait()
+            if self.broken:
+                raise RuntimeError, "Socket connection broken by client!"
+            self.enqueue(msg)
+        finally:
+            self.outboxCond.release()
+
+    def queueMsg(self, tag, kind, payload=''):
+        """
+        Hands a message to the sender thread without waiting, however
+        much is queued already. Returns False if the message was dropped
+        because the connection is broken.
+        """
+        self.outboxCond.acquire()
+        try:
+            if self.broken:
+                return False
+            self.enqueue(self.makeMsg(tag, kind, payload))
+            return True
+        finally:
+            self.outboxCond.release()
+
+    def enqueue(self, msg):
+        # Handing every message over to the sender thread costs a thread
+        # switch, which is about as much as the round trip of a small
+        # request. So send whatever the socket takes right away if nothing
+        # is waiting before it, and leave only the rest to the sender.
+        if not self.outbox and not self.sending:
+            try:
+                msg = self.sendWithoutWaiting(msg)
+            except socket.error:
+                self.setBroken()
+                return
+            if not msg:
+                return
+
+        self.outbox.append(msg)
+        self.numQueued += sum([len(data) for data in msg])
+        self.outboxCond.notifyAll()
+
+    def sendWithoutWaiting(self, msg):
+        """
+        Sends as much of the message as the socket takes without blocking
+        and returns what is left of it.
+        """
+        left = list(msg)
+        while left:
+            try:
+                numSent = self.sock.send(left[0], socket.MSG_DONTWAIT)
+            except socket.error, (en, errmsg):
+                if en in (errno.EAGAIN, errno.EWOULDBLOCK):
+                    return tuple(left)
+                if en == errno.EINTR:
+                    continue
+                raise
+            if numSent < len(left[0]):
+                left[0] = memoryview(left[0])[numSent:]
+            else:
+                left.pop(0)
+        return ()
+
+    def setBroken(self):
+        # Nobody is listening anymore. Let go of everything and of everyone
+        # waiting to send more.
+        self.broken = True
+        self.outbox.clear()
+        self.numQueued = 0
+        self.outboxCond.notifyAll()
+
+    def isFull(self):
+        return self.outbox is not None and self.numQueued > self.maxQueued
+
+    def runSender(self):
+        while 1:
+            self.outboxCond.acquire()
+            try:
+                while not self.outbox and not self.closing:
+                    self.outboxCond.wait()
+                if not self.outbox:
+                    return
+                msg = self.outbox.popleft()
+                self.sending = True
+            finally:
+                self.outboxCond.release()
+
+            try:
+                for data in msg:
+                    sendData(self.sock, data)
+            except:
+                self.outboxCond.acquire()
+                self.sending = False
+                self.setBroken()
+                self.outboxCond.release()
+                return
+
+            self.outboxCond.acquire()
+            self.sending = False
+            wasOver = self.numQueued > self.maxQueued/2
+            self.numQueued -= sum([len(data) for data in msg])
+            drained = wasOver and self.numQueued <= self.maxQueued/2
+            self.outboxCond.notifyAll()
+            self.outboxCond.release()
+
+            if drained and self.onDrained:
+                self.onDrained()
+
+    def hasPendingData(self):
+        """
+        Returns True if readMsg() has something to read right away.
+        """
+        if '\n' in self.buffer:
+            return True
+        r, w, e = select.select([self.sock], [], [], 0)
+        return bool(r)
+
+    def recvMore(self):
+        n = self.sock.recv_into(self.recvBuf)
+        if not n:
+            return False
+        self.buffer += memoryview(self.recvBuf)[:n]
+        return True
+
+    def readMsg(self):
+        """
+        Returns the next message as a (tag, kind, payload) tuple or None if
+        the other end closed the connection.
+        """
+        while 1:
+            end = self.buffer.find('\n')
+            if end != -1:
+                break
+            if not self.recvMore():
+                return None
+
+        tag, kind, length = str(self.buffer[:end]).split(' ')
+        tag, length = int(tag), int(length)
+        start = end + 1
+
+        if len(self.buffer) - start >= length:
+            payload = str(self.buffer[start:start+length])
+            del self.buffer[:start+length]
+            return (tag, kind, payload)
+
+        # Receive the rest of a large payload straight into its place.
+        payload = bytearray(length)
+        numRead = len(self.buffer) - start
+        payload[:numRead] = self.buffer[start:]
+        del self.buffer[:]
+        view = memoryview(payload)
+        while numRead < length:
+            n = self.sock.recv_into(view[numRead:])
+            if not n:
+                return None
+            numRead += n
+
+        return (tag, kind, str(payload))
+
+    def close(self):
+        if self.outbox is not None:
+            # Let the sender get out what it has, such as our goodbye.
+            self.outboxCond.acquire()
+            self.closing = True
+            self.outboxCond.notifyAll()
+            self.outboxCond.release()
+            if self.sender is not threading.currentThread():
+                self.sender.join(1.0)
+        try:
+            self.sock.shutdown(2)
+        except:
+            pass
+        self.sock.close()
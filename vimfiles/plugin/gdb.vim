@@ -1,6 +1,8 @@
 if has('gui_running')
     amenu &Gdb.Start\ Gdb               :call gdb#gdb#Init()<CR>
     amenu &Gdb.Show\ Command\ Window    :call gdb#gdb#ShowCmdWindow()<CR>
+    amenu &Gdb.Show\ Program\ Output    :call gdb#gdb#ShowProgramOutput()<CR>
+    amenu &Gdb.Show\ Output\ History    :call gdb#gdb#ShowOutputHistory()<CR>
 
     amenu &Gdb.&Step        :call gdb#gdb#Step()<CR>
     amenu &Gdb.&Next        :call gdb#gdb#Next()<CR>
@@ -30,6 +32,7 @@ if has('gui_running')
     nmenu &Gdb.&Print\ Value :call gdb#gdb#RunCommand("print " . expand("<cword>"))<CR>
     vmenu &Gdb.&Print\ Value y:call gdb#gdb#RunCommand("print <C-R>"")<CR>
     amenu &Gdb.Run\ Command  :call gdb#gdb#RunCommand('')<CR>
+    amenu &Gdb.Send\ Program\ Input  :call gdb#gdb#SendProgramInput('')<CR>
 
     amenu &Gdb.-sep2- <Nop>
 